@@ -0,0 +1,218 @@
+"""
+Sales rollups: revenue, units and order counts per day, category and product.
+
+Order writes keep ``sales_rollups`` current in the same transaction.
+``create_order`` adds an order's sales, and ``update_order_status`` subtracts
+them when an order is cancelled (and adds them back if it is reinstated).
+Each write is one multi-row upsert, so dashboards read a handful of rows no
+matter how long the order history is.
+
+Every checkout touches the overall total and today's row, and most touch one
+of a few categories. A single row for each would serialize concurrent
+checkouts on its lock until commit. These dimensions are therefore split
+over ``SALES_ROLLUP_SHARDS`` rows per key, picked by order ID, and summed
+when read. Product rows are not sharded. A product's row is only contended
+by checkouts that already wait on that product's stock row, and one row per
+product keeps "top products" an index walk.
+
+Sales are attributed to the category recorded on each order item at
+checkout, so cancelling an order subtracts from the same category it was
+added to even if the product has moved since. Items from before that column
+existed fall back to the product's current category. A rebuild recomputes
+everything from order history the same way:
+
+    python -m backend.analytics   # rebuild sales_rollups from orders
+"""
+
+import asyncio
+from datetime import date, datetime
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import String, cast, delete, distinct, func, literal, select, text
+
+from .config import settings
+from .database import IS_SQLITE, database, upsert
+from .models import categories, order_items, orders, products, sales_rollups
+
+DIMENSIONS = ("day", "category", "product")
+
+# Dimensions whose rows every (or nearly every) checkout updates
+SHARDED_DIMENSIONS = ("total", "day", "category")
+
+def rollup_shard(order_id: int) -> int:
+    """The shard an order's sales go to in the sharded dimensions."""
+    return order_id % settings.SALES_ROLLUP_SHARDS
+
+def counts_toward_sales(status: str) -> bool:
+    return status != "cancelled"
+
+async def record_order_sales(
+    order_id: int,
+    created_at: datetime,
+    items: Iterable[Tuple[int, int, int, float]],
+    sign: int = 1
+):
+    """Add (sign=1) or remove (sign=-1) one order's sales from the rollups.
+
+    ``items`` are (product_id, category_id, quantity, unit price). Call inside
+    the transaction that writes the order.
+    """
+    shard = rollup_shard(order_id)
+    deltas: Dict[Tuple[str, str, int], list] = {}
+    def add(dimension: str, key: str, revenue: float, units: int):
+        row_key = (dimension, key, shard if dimension in SHARDED_DIMENSIONS else 0)
+        delta = deltas.setdefault(row_key, [0.0, 0])
+        delta[0] += revenue
+        delta[1] += units
+
+    day = created_at.date().isoformat()
+    for product_id, category_id, quantity, price in items:
+        revenue = quantity * price
+        add("total", "", revenue, quantity)
+        add("day", day, revenue, quantity)
+        if category_id is not None:
+            add("category", str(category_id), revenue, quantity)
+        add("product", str(product_id), revenue, quantity)
+    if not deltas:
+        return
+
+    # Sorted so concurrent orders lock shared rows in the same order
+    statement = upsert(sales_rollups).values([
+        {
+            "dimension": dimension, "key": key, "shard": row_shard,
+            "revenue": sign * revenue, "units": sign * units, "orders": sign
+        }
+        for (dimension, key, row_shard), (revenue, units) in sorted(deltas.items())
+    ])
+    statement = statement.on_conflict_do_update(
+        index_elements=[sales_rollups.c.dimension, sales_rollups.c.key, sales_rollups.c.shard],
+        set_={
+            "revenue": sales_rollups.c.revenue + statement.excluded.revenue,
+            "units": sales_rollups.c.units + statement.excluded.units,
+            "orders": sales_rollups.c.orders + statement.excluded.orders,
+        }
+    )
+    await database.execute(statement)
+
+def _sale_category():
+    # The category recorded at checkout, else (older items) the current one
+    return func.coalesce(order_items.c.category_id, products.c.category_id)
+
+async def order_sales_items(order_id: int):
+    """(product_id, category_id, quantity, price) for each line of an order."""
+    rows = await database.fetch_all(
+        select(order_items.c.product_id, _sale_category(), order_items.c.quantity, order_items.c.price)
+        .select_from(order_items.outerjoin(products, products.c.id == order_items.c.product_id))
+        .where(order_items.c.order_id == order_id)
+    )
+    return [tuple(row._mapping) for row in rows]
+
+def _rounded(row) -> dict:
+    return {"revenue": round(row["revenue"], 2), "units": row["units"], "orders": row["orders"]}
+
+async def get_analytics(
+    dimension: str,
+    limit: int,
+    start: Optional[date] = None,
+    end: Optional[date] = None
+) -> dict:
+    """Totals plus up to ``limit`` rollup rows: days newest first, otherwise by revenue."""
+    revenue = func.sum(sales_rollups.c.revenue).label("revenue")
+    units = func.sum(sales_rollups.c.units).label("units")
+    order_count = func.sum(sales_rollups.c.orders).label("orders")
+    totals = await database.fetch_one(
+        select(revenue, units, order_count)
+        .where(sales_rollups.c.dimension == "total")
+        .where(sales_rollups.c.key == "")
+    )
+    if dimension == "product":
+        # Unsharded: one row per product, read in revenue order from the index
+        query = (
+            select(sales_rollups.c.key, sales_rollups.c.revenue, sales_rollups.c.units, sales_rollups.c.orders)
+            .where(sales_rollups.c.dimension == dimension)
+            .where(sales_rollups.c.orders > 0)
+            .order_by(sales_rollups.c.revenue.desc())
+        )
+    else:
+        # Sum each key's shards; rows whose orders were all cancelled stay
+        # behind at zero until a rebuild
+        query = (
+            select(sales_rollups.c.key, revenue, units, order_count)
+            .where(sales_rollups.c.dimension == dimension)
+            .group_by(sales_rollups.c.key)
+            .having(order_count > 0)
+        )
+        if dimension == "day":
+            if start is not None:
+                query = query.where(sales_rollups.c.key >= start.isoformat())
+            if end is not None:
+                query = query.where(sales_rollups.c.key <= end.isoformat())
+            query = query.order_by(sales_rollups.c.key.desc())
+        else:
+            query = query.order_by(revenue.desc())
+    rows = await database.fetch_all(query.limit(limit))
+
+    names = {}
+    if dimension != "day" and rows:
+        named = categories if dimension == "category" else products
+        ids = [int(row["key"]) for row in rows]
+        for row in await database.fetch_all(select(named.c.id, named.c.name).where(named.c.id.in_(ids))):
+            names[str(row["id"])] = row["name"]
+
+    return {
+        "dimension": dimension,
+        "totals": _rounded(totals) if totals["orders"] is not None else {"revenue": 0.0, "units": 0, "orders": 0},
+        "rows": [{"key": row["key"], "name": names.get(row["key"]), **_rounded(row)} for row in rows],
+    }
+
+async def rebuild_rollups():
+    """Recompute every rollup row from order history in one transaction."""
+    revenue = func.sum(order_items.c.quantity * order_items.c.price)
+    units = func.sum(order_items.c.quantity)
+    order_count = func.count(distinct(orders.c.id))
+    sold = (
+        order_items.join(orders, orders.c.id == order_items.c.order_id)
+        .outerjoin(products, products.c.id == order_items.c.product_id)
+    )
+    groups = {
+        "total": None,
+        "day": cast(func.date(orders.c.created_at), String),
+        "category": cast(_sale_category(), String),
+        "product": cast(order_items.c.product_id, String),
+    }
+    columns = ["dimension", "key", "shard", "revenue", "units", "orders"]
+
+    async with database.transaction():
+        if not IS_SQLITE:
+            # Order writes upserting rollups wait for the rebuild rather than
+            # landing between its DELETE and INSERTs
+            await database.execute(text("LOCK TABLE sales_rollups IN EXCLUSIVE MODE"))
+        await database.execute(delete(sales_rollups))
+        for dimension, key in groups.items():
+            query = (
+                select(
+                    literal(dimension), key if key is not None else literal(""), literal(0),
+                    revenue, units, order_count
+                )
+                .select_from(sold)
+                .where(orders.c.status != "cancelled")
+            )
+            if dimension == "category":
+                # Legacy items whose product has since been deleted have no category
+                query = query.where(_sale_category().isnot(None))
+            if key is not None:
+                query = query.group_by(key)
+            else:
+                query = query.having(func.count() > 0)
+            await database.execute(sales_rollups.insert().from_select(columns, query))
+
+async def _main():
+    await database.connect()
+    try:
+        await rebuild_rollups()
+    finally:
+        await database.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
+    print("Sales rollups rebuilt successfully!")
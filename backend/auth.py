@@ -1,18 +1,94 @@
-from datetime import datetime, timedelta
+import hashlib
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy import select
 from .config import settings
 from .crud import get_user_by_email
+from .cache import principal_cache, token_cache, revoked_tokens
+from .database import database, upsert
+from .models import token_revocations
 import logging
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
 
+def _token_key(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def decode_token(token: str) -> dict:
+    """Verify a token and return its payload, reusing earlier verifications.
+
+    Raises JWTError if the token is invalid, expired or revoked.
+    """
+    key = _token_key(token)
+    if key in revoked_tokens:
+        raise JWTError("Token has been revoked")
+    payload = token_cache.get(key)
+    if payload is None:
+        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        remaining = payload.get("exp", 0) - time.time()
+        if remaining > 0:
+            token_cache.set(key, payload, ttl=remaining)
+    return payload
+
+# Revocations are shared through the token_revocations table. Each worker
+# checks its in-memory copy (revoked_tokens) and pulls rows added by other
+# workers at most every REVOCATION_SYNC_SECONDS. The pull re-reads a few
+# seconds before the newest row it has seen, so that clock skew between
+# workers cannot make it miss a row.
+SYNC_OVERLAP = timedelta(seconds=5)
+_last_sync = float("-inf")
+_sync_watermark: Optional[datetime] = None
+
+def _epoch(moment: datetime) -> float:
+    return moment.replace(tzinfo=timezone.utc).timestamp()
+
+async def sync_revoked_tokens():
+    """Copy revocations made by other workers into this worker's list."""
+    global _last_sync, _sync_watermark
+    now = time.monotonic()
+    if now - _last_sync < settings.REVOCATION_SYNC_SECONDS:
+        return
+    _last_sync = now
+    query = (
+        select(token_revocations.c.token_hash, token_revocations.c.expires_at, token_revocations.c.revoked_at)
+        .where(token_revocations.c.expires_at > datetime.utcnow())
+    )
+    if _sync_watermark is not None:
+        query = query.where(token_revocations.c.revoked_at >= _sync_watermark - SYNC_OVERLAP)
+    for row in await database.fetch_all(query):
+        token_hash, expires_at, revoked_at = row._mapping
+        revoked_tokens.add(bytes.fromhex(token_hash), _epoch(expires_at))
+        if _sync_watermark is None or revoked_at > _sync_watermark:
+            _sync_watermark = revoked_at
+
+async def revoke_token(token: str):
+    """Reject a token from now on, in every worker, until it expires."""
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        return
+    key = _token_key(token)
+    token_cache.invalidate(key)
+    expires = payload.get("exp", 0)
+    if expires <= time.time():
+        return
+    revoked_tokens.add(key, expires)
+    now = datetime.utcnow()
+    statement = upsert(token_revocations).values(
+        token_hash=key.hex(),
+        expires_at=datetime.utcfromtimestamp(expires),
+        revoked_at=now
+    )
+    await database.execute(statement.on_conflict_do_nothing())
+    # Logouts are rare enough to tidy up revocations of tokens that have expired
+    await database.execute(token_revocations.delete().where(token_revocations.c.expires_at <= now))
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -20,19 +96,17 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
-    logger.debug(f"Creating token with data: {to_encode}")
+    logger.debug("Creating token for user %s", to_encode.get("user_id"))
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
 def verify_access_token(token: str):
     try:
-        logger.debug(f"Verifying token: {token[:10]}...")
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        logger.debug(f"Decoded payload: {payload}")
+        payload = decode_token(token)
         user_id: int = payload.get("user_id")
         email: str = payload.get("email")
         if email is None or user_id is None:
-            logger.error("Missing email or user_id in token payload")
+            logger.warning("Missing email or user_id in token payload")
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Could not validate credentials",
@@ -40,13 +114,21 @@ def verify_access_token(token: str):
             )
         return payload
     except JWTError as e:
-        logger.error(f"JWT Error: {str(e)}")
+        logger.warning("JWT error: %s", e)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+def token_user_id(token: str) -> Optional[int]:
+    """Return the user_id of a valid access token, or None; never raises."""
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        return None
+    return payload.get("user_id")
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -54,22 +136,31 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    await sync_revoked_tokens()
     try:
         payload = verify_access_token(credentials.credentials)
+        user_id: int = payload.get("user_id")
         email: str = payload.get("email")
-        if email is None:
+        if email is None or user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
+    
+    # Serve the principal from the short-lived cache; a cached entry only
+    # counts if it still matches the email the token was issued for.
+    principal = principal_cache.get(user_id)
+    if principal is None or principal["email"] != email:
+        user = await get_user_by_email(email)
+        if user is None or user["id"] != user_id:
+            raise credentials_exception
         
-    user = await get_user_by_email(email)
-    if user is None:
-        raise credentials_exception
+        # Keep only the fields expected by UserOut schema
+        principal = {
+            "id": user["id"],
+            "name": user["name"],
+            "email": user["email"],
+            "is_admin": user["is_admin"]
+        }
+        principal_cache.set(user_id, principal)
     
-    # Return only the fields expected by UserOut schema
-    return {
-        "id": user["id"],
-        "name": user["name"],
-        "email": user["email"],
-        "is_admin": user["is_admin"]
-    }
\ No newline at end of file
+    return dict(principal)
@@ -0,0 +1,318 @@
+"""
+Bulk product import and table export, streamed as CSV or NDJSON.
+
+The upload is parsed line by line as it arrives, so memory use is bounded
+by one insert chunk rather than the file size. A line, or a multi-line CSV
+record, longer than ``IMPORT_MAX_RECORD_CHARS`` is skipped and reported
+rather than buffered.
+Each row is validated against ``ProductCreate``. Category names or IDs are
+resolved against a single lookup of the categories table. Valid rows are
+written with the driver's executemany in chunks of ``IMPORT_CHUNK_SIZE``,
+one transaction per chunk. Rows that fail are reported by line number and
+do not stop the import.
+
+Exports stream a whole table in primary key order, one batch of
+``EXPORT_BATCH_SIZE`` rows at a time. On Postgres the rows come from a
+server-side cursor. SQLite has none, so there the batches are keyset reads.
+"""
+
+import codecs
+import csv
+import io
+import json
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import select
+
+from .cache import invalidate_products
+from .config import settings
+from .database import IS_SQLITE, database
+from .models import categories, order_items, orders, products
+from .schemas import ProductCreate
+from .serialization import dumps
+
+# Upload format -> Content-Type that selects it
+IMPORT_FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# Rendered once and run through the driver's executemany; compiling a
+# multi-row INSERT through SQLAlchemy costs more than executing it
+IMPORT_COLUMNS = ("name", "description", "price", "stock", "image_url", "category_id")
+_PLACEHOLDERS = ", ".join("?" if IS_SQLITE else f"${i}" for i in range(1, len(IMPORT_COLUMNS) + 1))
+INSERT_SQL = f"INSERT INTO {products.name} ({', '.join(IMPORT_COLUMNS)}) VALUES ({_PLACEHOLDERS})"
+
+# Row error for a record or line over IMPORT_MAX_RECORD_CHARS, which is skipped
+TOO_LONG = f"Record exceeds {settings.IMPORT_MAX_RECORD_CHARS} characters"
+
+# Empty CSV cells in these columns mean "no value" rather than an empty string
+OPTIONAL_COLUMNS = ("description", "image_url")
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Optional[str]]]:
+    """Yield (line number, text) from a stream of UTF-8 byte chunks.
+
+    A line longer than ``IMPORT_MAX_RECORD_CHARS`` is not kept: the rest of
+    it is skipped up to the next newline and it is yielded with text None.
+    Only newly decoded text is searched for newlines, and a partial line is
+    kept as a list of pieces, so a file without newlines costs linear time
+    and bounded memory.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    limit = settings.IMPORT_MAX_RECORD_CHARS
+    pieces: List[str] = []
+    size = 0
+    skipping = False
+    line_no = 0
+
+    def take(text: str):
+        """Add text without a newline to the current line, within the limit."""
+        nonlocal pieces, size, skipping
+        if skipping or not text:
+            return
+        size += len(text)
+        if size > limit:
+            pieces, size, skipping = [], 0, True
+        else:
+            pieces.append(text)
+
+    def finish() -> Optional[str]:
+        nonlocal pieces, size, skipping
+        line = None if skipping else "".join(pieces).rstrip("\r")
+        pieces, size, skipping = [], 0, False
+        return line
+
+    async for chunk in chunks:
+        text = decoder.decode(chunk)
+        start = 0
+        end = text.find("\n")
+        while end != -1:
+            take(text[start:end])
+            line_no += 1
+            yield line_no, finish()
+            start = end + 1
+            end = text.find("\n", start)
+        take(text[start:])
+    take(decoder.decode(b"", final=True))
+    if pieces or skipping:
+        yield line_no + 1, finish()
+
+def _in_quoted_field(line: str, quoted: bool) -> bool:
+    """Whether a quoted field is still open at the end of ``line``.
+
+    Follows the csv module's rules: a quote only opens a field at its start,
+    and ``""`` inside a quoted field is an escaped quote. ``quoted`` is the
+    state carried over from the previous line of the same record.
+    """
+    i = line.find('"')
+    while i != -1:
+        if quoted:
+            if line.startswith('"', i + 1):
+                i = line.find('"', i + 2)
+                continue
+            quoted = False
+        elif i == 0 or line[i - 1] == ",":
+            quoted = True
+        i = line.find('"', i + 1)
+    return quoted
+
+async def _csv_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (line number, dict or error message) for each CSV record after the header."""
+    header = None
+    pending: List[str] = []
+    pending_size = 0
+    oversized = False
+    start = 0
+    quoted = False
+    async for line_no, line in _lines(chunks):
+        if line is None:
+            # Over-long physical line. Its quoting is unknown, so it ends the
+            # record it belongs to
+            if header is None:
+                raise ValueError(f"CSV header exceeds {settings.IMPORT_MAX_RECORD_CHARS} characters")
+            yield (start if pending or oversized else line_no), TOO_LONG
+            pending, pending_size, oversized, quoted = [], 0, False, False
+            continue
+        if not pending and not oversized:
+            if not line.strip():
+                continue
+            start = line_no
+        # A record continues onto the next line while a quoted field is open
+        quoted = _in_quoted_field(line, quoted)
+        if not oversized:
+            pending.append(line)
+            pending_size += len(line) + 1
+            if pending_size > settings.IMPORT_MAX_RECORD_CHARS:
+                # Stop buffering; skip the rest of the record as it arrives
+                if header is None:
+                    raise ValueError(f"CSV header exceeds {settings.IMPORT_MAX_RECORD_CHARS} characters")
+                oversized = True
+                pending, pending_size = [], 0
+        if quoted:
+            continue
+        if oversized:
+            oversized = False
+            yield start, TOO_LONG
+            continue
+        text = "\n".join(pending)
+        pending, pending_size = [], 0
+        try:
+            record = next(csv.reader([text]))
+        except csv.Error as e:
+            # e.g. a bare "\r" (old Mac line endings) outside a quoted field
+            if header is None:
+                raise ValueError(f"Invalid CSV header: {e}")
+            yield start, f"Invalid CSV: {e}"
+            continue
+        if header is None:
+            header = [column.strip() for column in record]
+            missing = {"name", "price", "stock"} - set(header)
+            if missing or not {"category_id", "category"} & set(header):
+                raise ValueError(
+                    "CSV header must include name, price, stock and category_id or category"
+                )
+            continue
+        if len(record) != len(header):
+            yield start, f"Expected {len(header)} columns, got {len(record)}"
+            continue
+        row = dict(zip(header, record))
+        for column in OPTIONAL_COLUMNS:
+            if row.get(column) == "":
+                row[column] = None
+        yield start, row
+    if pending or oversized:
+        yield start, "Unterminated quoted field"
+    if header is None:
+        raise ValueError("Empty CSV upload")
+
+async def _ndjson_rows(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, object]]:
+    """Yield (line number, dict or error message) for each NDJSON line."""
+    async for line_no, line in _lines(chunks):
+        if line is None:
+            yield line_no, TOO_LONG
+            continue
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_no, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield line_no, "Expected a JSON object"
+            continue
+        yield line_no, row
+
+async def _category_lookup() -> Tuple[set, Dict[str, int]]:
+    """All category IDs, and IDs by case-folded name, from one query."""
+    ids, by_name = set(), {}
+    for row in await database.fetch_all(select(categories.c.id, categories.c.name)):
+        category_id, name = row._mapping
+        ids.add(category_id)
+        by_name[name.casefold()] = category_id
+    return ids, by_name
+
+def _validate(row: dict, category_ids: set, category_names: Dict[str, int]) -> Tuple[Optional[tuple], Optional[str]]:
+    """Return (values to insert, None) or (None, error message) for one row."""
+    row = dict(row)
+    name = row.pop("category", None)
+    if row.get("category_id") in (None, "") and name:
+        row["category_id"] = category_names.get(str(name).strip().casefold())
+        if row["category_id"] is None:
+            return None, f"Unknown category '{name}'"
+    try:
+        product = ProductCreate(**row)
+    except ValidationError as e:
+        return None, "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+        )
+    if product.category_id not in category_ids:
+        return None, f"Category {product.category_id} not found"
+    return tuple(getattr(product, column) for column in IMPORT_COLUMNS), None
+
+async def import_products(chunks: AsyncIterator[bytes], fmt: str) -> dict:
+    """Import products from a byte stream in ``fmt`` ("csv" or "ndjson") and return a report."""
+    rows = _csv_rows(chunks) if fmt == "csv" else _ndjson_rows(chunks)
+    category_ids, category_names = await _category_lookup()
+    report = {"inserted": 0, "failed": 0, "errors": [], "errors_truncated": False}
+
+    def fail(line_no: int, message: str):
+        report["failed"] += 1
+        if len(report["errors"]) < settings.IMPORT_MAX_ERRORS:
+            report["errors"].append({"line": line_no, "error": message})
+        else:
+            report["errors_truncated"] = True
+
+    async def flush(batch: List[Tuple[int, tuple]]):
+        try:
+            async with database.transaction():
+                await database.executemany_raw(INSERT_SQL, [values for _, values in batch])
+        except Exception as e:
+            for line_no, _ in batch:
+                fail(line_no, f"Insert failed: {e}")
+        else:
+            report["inserted"] += len(batch)
+
+    batch: List[Tuple[int, tuple]] = []
+    try:
+        async for line_no, row in rows:
+            if isinstance(row, str):
+                fail(line_no, row)
+                continue
+            values, error = _validate(row, category_ids, category_names)
+            if error:
+                fail(line_no, error)
+                continue
+            batch.append((line_no, values))
+            if len(batch) >= settings.IMPORT_CHUNK_SIZE:
+                await flush(batch)
+                batch = []
+        if batch:
+            await flush(batch)
+    finally:
+        if report["inserted"]:
+            invalidate_products()
+    return report
+
+# Exportable table name -> table, and export format -> Content-Type
+EXPORT_TABLES = {"orders": orders, "order_items": order_items, "products": products}
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+async def _export_batches(table) -> AsyncIterator[List[tuple]]:
+    """Yield the table's rows as lists of value tuples, in ID order."""
+    query = select(table).order_by(table.c.id)
+    size = settings.EXPORT_BATCH_SIZE
+    if IS_SQLITE:
+        last_id = None
+        while True:
+            page = query if last_id is None else query.where(table.c.id > last_id)
+            rows = await database.fetch_all(page.limit(size))
+            if rows:
+                yield [tuple(row._mapping) for row in rows]
+            if len(rows) < size:
+                return
+            last_id = rows[-1]["id"]
+    else:
+        batch = []
+        async for row in database.iterate(query):
+            batch.append(tuple(row._mapping))
+            if len(batch) == size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+def _csv_bytes(rows) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+async def export_table(table_name: str, fmt: str) -> AsyncIterator[bytes]:
+    """Stream every row of an ``EXPORT_TABLES`` table as ``fmt`` ("ndjson" or "csv")."""
+    table = EXPORT_TABLES[table_name]
+    columns = tuple(str(column.name) for column in table.c)
+    if fmt == "csv":
+        yield _csv_bytes([columns])
+    async for batch in _export_batches(table):
+        if fmt == "csv":
+            yield _csv_bytes(batch)
+        else:
+            yield b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in batch)
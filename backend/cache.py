@@ -0,0 +1,175 @@
+"""
+In-process caches for catalog reads.
+Entries are evicted least-recently-used once a cache is full and expire after a TTL,
+so a worker that misses an invalidation from another worker serves stale data for at most TTL seconds.
+"""
+
+import hashlib
+import heapq
+import secrets
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from .config import settings
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire after ``ttl`` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, expires_at = entry
+        if expires_at <= self._clock():
+            del self._data[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (value, self._clock() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+class RevocationList:
+    """Keys rejected until a fixed expiry time (seconds since the epoch).
+
+    Unlike TTLCache there is no size bound and no LRU eviction: dropping an
+    entry early would let a logged-out token back in. Entries are purged in
+    expiry order once their time has passed.
+    """
+
+    def __init__(self, clock=time.time):
+        self._clock = clock
+        self._expiry: Dict[Hashable, float] = {}
+        self._heap: List[Tuple[float, Hashable]] = []
+
+    def add(self, key: Hashable, expires_at: float):
+        if expires_at <= self._clock() or self._expiry.get(key, 0) >= expires_at:
+            return
+        self._expiry[key] = expires_at
+        heapq.heappush(self._heap, (expires_at, key))
+
+    def _purge(self):
+        now = self._clock()
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            if self._expiry.get(key) == expires_at:
+                del self._expiry[key]
+
+    def __contains__(self, key: Hashable) -> bool:
+        self._purge()
+        return key in self._expiry
+
+    def __len__(self):
+        self._purge()
+        return len(self._expiry)
+
+# Catalog caches
+product_cache = TTLCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+product_list_cache = TTLCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+category_cache = TTLCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+category_list_cache = TTLCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+
+# Authenticated principals (id, name, email, is_admin) keyed by user ID
+principal_cache = TTLCache(settings.PRINCIPAL_CACHE_MAX_ENTRIES, settings.PRINCIPAL_CACHE_TTL_SECONDS)
+
+# Verified JWT payloads keyed by a hash of the token, each expiring at the token's exp claim
+token_cache = TTLCache(settings.TOKEN_CACHE_MAX_ENTRIES, settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+# Hashes of logged-out tokens, remembered until the token would have expired
+# anyway. This worker's copy of the token_revocations table; see auth.py.
+revoked_tokens = RevocationList()
+
+# Compressed response bodies keyed by (ETag, encoding); see compression.py
+compressed_body_cache = TTLCache(settings.COMPRESSION_CACHE_MAX_ENTRIES, settings.CACHE_TTL_SECONDS)
+
+# Bumped on every catalog write. ETags combine it with a per-process ID (so two
+# workers never issue the same tag for different data) and the current TTL
+# window (so a worker that missed another worker's write stops validating
+# stale copies once its cache would have expired them).
+catalog_version = 0
+_process_id = secrets.token_hex(4)
+
+def bump_catalog_version():
+    global catalog_version
+    catalog_version += 1
+
+def catalog_etag(resource: str) -> str:
+    """Strong ETag for a catalog resource (path plus query string) at the current version."""
+    window = int(time.time() // settings.CACHE_TTL_SECONDS)
+    tag = f"{_process_id}:{catalog_version}:{window}:{resource}"
+    return '"' + hashlib.blake2b(tag.encode(), digest_size=12).hexdigest() + '"'
+
+def invalidate_products(*product_ids: int):
+    """Drop cached entries affected by a write to the given products."""
+    bump_catalog_version()
+    for product_id in product_ids:
+        product_cache.invalidate(product_id)
+    product_list_cache.clear()
+
+def invalidate_categories(*category_ids: int):
+    """Drop cached entries affected by a write to the given categories.
+
+    Products embed their category and are cascade-deleted with it, so every
+    cached product is dropped as well.
+    """
+    bump_catalog_version()
+    for category_id in category_ids:
+        category_cache.invalidate(category_id)
+    category_list_cache.clear()
+    product_cache.clear()
+    product_list_cache.clear()
+
+def invalidate_principal(user_id: int):
+    """Drop the cached principal after a change to the user's email or role."""
+    principal_cache.invalidate(user_id)
+
+def cache_stats() -> dict:
+    return {
+        "products": product_cache.stats(),
+        "product_lists": product_list_cache.stats(),
+        "categories": category_cache.stats(),
+        "category_lists": category_list_cache.stats(),
+        "principals": principal_cache.stats(),
+        "tokens": token_cache.stats(),
+        "revoked_tokens": {"size": len(revoked_tokens)},
+        "compressed_bodies": compressed_body_cache.stats(),
+    }
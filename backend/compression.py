@@ -0,0 +1,176 @@
+"""
+Response compression as raw ASGI middleware.
+
+The encoding is negotiated from Accept-Encoding: zstd and brotli when their
+packages are installed, gzip always. Only compressible content types above
+COMPRESSION_MIN_SIZE are compressed. Streamed responses are compressed chunk
+by chunk.
+
+A compressed response keeps a strong ETag by appending the encoding to it
+(``"abc"`` becomes ``"abc-gzip"``). Catalog ETags already change with the
+catalog version, so compressed bodies are cached by (ETag, encoding) and an
+unchanged listing is compressed once per version rather than per request.
+"""
+
+import gzip
+import zlib
+from typing import Callable, Dict, NamedTuple, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from .cache import compressed_body_cache
+from .config import settings
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional dependency
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+COMPRESSIBLE_TYPES = ("application/json", "application/x-ndjson", "text/")
+
+class Codec(NamedTuple):
+    name: str
+    compress: Callable[[bytes], bytes]
+    # Returns an object with compress(chunk) -> bytes and flush() -> bytes
+    stream: Callable[[], object]
+
+class _BrotliStream:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def flush(self) -> bytes:
+        return self._compressor.finish()
+
+def _gzip(data: bytes) -> bytes:
+    return gzip.compress(data, settings.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+def _gzip_stream():
+    return zlib.compressobj(settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, 31)
+
+def _brotli(data: bytes) -> bytes:
+    return brotli.compress(data, quality=settings.COMPRESSION_BROTLI_QUALITY)
+
+def _build_codecs() -> Dict[str, Codec]:
+    """Available codecs, most preferred first."""
+    codecs = {}
+    if zstandard is not None:
+        zstd = zstandard.ZstdCompressor(level=settings.COMPRESSION_ZSTD_LEVEL)
+        codecs["zstd"] = Codec("zstd", zstd.compress, zstd.compressobj)
+    if brotli is not None:
+        codecs["br"] = Codec("br", _brotli, _BrotliStream)
+    codecs["gzip"] = Codec("gzip", _gzip, _gzip_stream)
+    return codecs
+
+CODECS = _build_codecs()
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[Codec]:
+    """Pick the best available codec for an Accept-Encoding header, or None."""
+    if not accept_encoding:
+        return None
+    weights = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip().lower()] = quality
+    wildcard = weights.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for name, codec in CODECS.items():
+        quality = weights.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = codec, quality
+    return best
+
+def base_etag(etag: str) -> str:
+    """Strip the encoding suffix a compressed response added to its ETag."""
+    for name in CODECS:
+        suffix = f'-{name}"'
+        if etag.endswith(suffix):
+            return etag[:-len(suffix)] + '"'
+    return etag
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size: Optional[int] = None):
+        self.app = app
+        self.minimum_size = settings.COMPRESSION_MIN_SIZE if minimum_size is None else minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        codec = negotiate(Headers(scope=scope).get("accept-encoding"))
+        start = None
+        stream = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, stream, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is None:
+                # First body chunk: decide whether to compress this response
+                headers = MutableHeaders(scope=start)
+                content_type = headers.get("content-type", "")
+                compressible = content_type.startswith(COMPRESSIBLE_TYPES)
+                if compressible:
+                    headers.add_vary_header("Accept-Encoding")
+                if (
+                    codec is None
+                    or not compressible
+                    or "content-encoding" in headers
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+
+                headers["content-encoding"] = codec.name
+                etag = headers.get("etag")
+                if etag and etag.startswith('"'):
+                    headers["etag"] = f'{etag[:-1]}-{codec.name}"'
+
+                if not more_body:
+                    key = (etag, codec.name)
+                    compressed = compressed_body_cache.get(key) if etag else None
+                    if compressed is None:
+                        compressed = codec.compress(body)
+                        if etag:
+                            compressed_body_cache.set(key, compressed)
+                    headers["content-length"] = str(len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+
+                del headers["content-length"]
+                stream = codec.stream()
+                await send(start)
+
+            chunk = stream.compress(body)
+            if not more_body:
+                chunk += stream.flush()
+            if chunk or not more_body:
+                await send({"type": "http.response.body", "body": chunk, "more_body": more_body})
+
+        await self.app(scope, receive, send_compressed)
@@ -9,6 +9,43 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     ALLOWED_ORIGINS: str = "http://localhost:8501"
     API_URL: str = "http://localhost:8000" 
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+    CACHE_MAX_ENTRIES: int = 10000
+    CACHE_TTL_SECONDS: float = 60
+    CATALOG_MAX_AGE: int = 0
+    COMPRESSION_MIN_SIZE: int = 1024
+    COMPRESSION_GZIP_LEVEL: int = 6
+    COMPRESSION_BROTLI_QUALITY: int = 5
+    COMPRESSION_ZSTD_LEVEL: int = 3
+    COMPRESSION_CACHE_MAX_ENTRIES: int = 1000
+    IMPORT_CHUNK_SIZE: int = 1000
+    IMPORT_MAX_ERRORS: int = 1000
+    IMPORT_MAX_RECORD_CHARS: int = 65536
+    EXPORT_BATCH_SIZE: int = 5000
+    IDEMPOTENCY_KEY_TTL_SECONDS: int = 86400
+    SALES_ROLLUP_SHARDS: int = 16
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30
+    TOKEN_CACHE_MAX_ENTRIES: int = 50000
+    REVOCATION_SYNC_SECONDS: float = 1
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_MAX_CONCURRENCY: int = 4
+    RATE_LIMIT_PER_MINUTE: int = 60
+    RATE_LIMIT_USER_PER_MINUTE: int = 120
+    RATE_LIMIT_AUTH_PER_MINUTE: int = 10
+    RATE_LIMIT_CATALOG_PER_MINUTE: int = 300
+    RATE_LIMIT_STORE: str = "memory"  # "memory" or "redis"
+    RATE_LIMIT_MAX_KEYS: int = 100000
+    RATE_LIMIT_IDLE_SECONDS: float = 600
+    REDIS_URL: str = "redis://localhost:6379/0"
+    DB_SLOW_QUERY_MS: float = 200
+    DB_REPEATED_QUERY_THRESHOLD: int = 10
+    CREATE_TABLES_ON_STARTUP: bool = False
+    LOG_LEVEL: str = "INFO"
+    LOG_LEVELS: str = "backend.auth=WARNING"  # per-logger overrides: "name=LEVEL,name=LEVEL"
+    LOG_SAMPLED_LOGGERS: str = "backend.auth,backend.database"  # hot-path loggers to rate-limit
+    LOG_SAMPLE_PER_SECOND: float = 5
     
     @property
     def origins(self) -> List[str]:
@@ -1,21 +1,34 @@
-import asyncio
-from database import database
-from models import metadata
-from sqlalchemy import create_engine
-import os
-from dotenv import load_dotenv
+"""
+Schema management, kept out of the application import path.
 
-load_dotenv()
+    python -m backend.create_tables          # create missing tables and indexes
+    python -m backend.create_tables --reset  # drop everything first
+"""
 
-# Getting database URL from .env file
-DATABASE_URL = os.getenv("DATABASE_URL")
+import argparse
+from sqlalchemy import create_engine
+from .config import settings
+from .models import metadata
+from .search import drop_search_index, ensure_search_index
 
-# Create tables
-def create_tables():
-    engine = create_engine(DATABASE_URL)
-    metadata.drop_all(engine)  # Drop existing tables
-    metadata.create_all(engine)  # Create new tables
-    print("Tables created successfully!")
+def create_tables(reset: bool = False):
+    engine = create_engine(settings.DATABASE_URL)
+    try:
+        if reset:
+            drop_search_index(engine)
+            metadata.drop_all(engine)  # Drop existing tables
+        metadata.create_all(engine)  # Create missing tables
+        # create_all skips existing tables, so add indexes declared since they were created
+        for table in metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(engine, checkfirst=True)
+        ensure_search_index(engine)
+    finally:
+        engine.dispose()
 
 if __name__ == "__main__":
-    create_tables()
+    parser = argparse.ArgumentParser(description="Create the database schema.")
+    parser.add_argument("--reset", action="store_true", help="drop all tables before creating them")
+    args = parser.parse_args()
+    create_tables(reset=args.reset)
+    print("Tables created successfully!")
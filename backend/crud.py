@@ -1,13 +1,25 @@
-from .database import database
-from .models import users, products, orders, order_items, categories
-from .schemas import UserCreate, ProductCreate, ProductUpdate, OrderCreate, CategoryCreate, CategoryUpdate
-from .utils import get_password_hash
+from .database import database, upsert
+from .models import users, products, orders, order_items, categories, cart_items
+from .schemas import (
+    UserCreate, ProductCreate, ProductUpdate, ProductFilters, OrderCreate, OrderItemCreate,
+    AdminOrderFilters, CategoryCreate, CategoryUpdate
+)
+from .cache import (
+    product_cache, product_list_cache, category_cache, category_list_cache,
+    invalidate_products, invalidate_categories, invalidate_principal
+)
+from .config import settings
+from .search import apply_search
+from .analytics import counts_toward_sales, order_sales_items, record_order_sales
+from .idempotency import request_fingerprint, store_response
+from .utils import password_hasher, encode_cursor, decode_cursor
 from datetime import datetime
-from sqlalchemy import select
+from typing import List, Optional
+from sqlalchemy import case, func, select, tuple_
 
 # User operations
 async def create_user(user: UserCreate, is_admin: bool = False):
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     query = users.insert().values(
         name=user.name,
         email=user.email,
@@ -31,28 +43,53 @@ async def get_user_by_email(email: str):
         }
     return None
 
+async def update_user(user_id: int, **values):
+    """Update user columns (e.g. email, is_admin) and drop the cached principal."""
+    query = users.update().where(users.c.id == user_id).values(**values)
+    await database.execute(query)
+    invalidate_principal(user_id)
+
 # Category operations
 async def create_category(category: CategoryCreate):
     query = categories.insert().values(**category.dict())
     category_id = await database.execute(query)
+    invalidate_categories(category_id)
     return {**category.dict(), "id": category_id}
 
 async def get_category(category_id: int):
+    cached = category_cache.get(category_id)
+    if cached is not None:
+        return cached
+
     query = categories.select().where(categories.c.id == category_id)
-    return await database.fetch_one(query)
+    result = await database.fetch_one(query)
+    if result:
+        category = dict(result)
+        category_cache.set(category_id, category)
+        return category
+    return None
 
 async def get_all_categories():
+    cached = category_list_cache.get("all")
+    if cached is not None:
+        return cached
+
     query = categories.select()
-    return await database.fetch_all(query)
+    results = [dict(result) for result in await database.fetch_all(query)]
+    category_list_cache.set("all", results)
+    return results
 
 async def update_category(category_id: int, category: CategoryUpdate):
     query = categories.update().where(categories.c.id == category_id).values(**category.dict())
     await database.execute(query)
+    invalidate_categories(category_id)
     return await get_category(category_id)
 
 async def delete_category(category_id: int):
     query = categories.delete().where(categories.c.id == category_id)
-    return await database.execute(query)
+    result = await database.execute(query)
+    invalidate_categories(category_id)
+    return result
 
 # Product operations
 async def create_product(product: ProductCreate):
@@ -63,66 +100,209 @@ async def create_product(product: ProductCreate):
     
     query = products.insert().values(**product.dict())
     product_id = await database.execute(query)
+    invalidate_products(product_id)
     return await get_product(product_id)
 
-async def get_product(product_id: int):
-    query = select(
+PRODUCT_FIELDS = tuple(str(column.name) for column in products.c)
+
+def _product_query():
+    # _product_row relies on this column order: every product column, then the category's
+    return select(
         products,
         categories.c.name.label('category_name'),
         categories.c.description.label('category_description'),
         categories.c.image_url.label('category_image_url')
-    ).join(categories).where(products.c.id == product_id)
+    ).join(categories)
+
+def _product_row(result):
+    # Rows map positionally straight into the ProductOut shape; keyed lookups
+    # through the databases Record cost over ten times as much per row.
+    values = tuple(result._mapping)
+    product = dict(zip(PRODUCT_FIELDS, values))
+    category_name, category_description, category_image_url = values[len(PRODUCT_FIELDS):]
+    product['category'] = {
+        'id': product['category_id'],
+        'name': category_name,
+        'description': category_description,
+        'image_url': category_image_url
+    }
+    return product
+
+# Sort name -> (keyset columns, descending). There is no creation timestamp on
+# products; IDs are assigned in insertion order, so "newest" sorts by ID.
+PRODUCT_SORTS = {
+    "id": ((products.c.id,), False),
+    "newest": ((products.c.id,), True),
+    "price_asc": ((products.c.price, products.c.id), False),
+    "price_desc": ((products.c.price, products.c.id), True),
+}
+
+# Upper bounds of the price facet buckets; the last bucket is open-ended
+PRICE_BUCKETS = (25, 50, 100, 250, 500)
+
+def _filter_products(query, filters: Optional[ProductFilters]):
+    if filters is None:
+        return query
+    if filters.category_id is not None:
+        query = query.where(products.c.category_id == filters.category_id)
+    if filters.min_price is not None:
+        query = query.where(products.c.price >= filters.min_price)
+    if filters.max_price is not None:
+        query = query.where(products.c.price <= filters.max_price)
+    if filters.in_stock:
+        query = query.where(products.c.stock > 0)
+    return query
+
+async def _fetch_product_page(query, limit: int, after: Optional[str], sort: str = "id"):
+    # Keyset pagination on the sort columns (always ending in products.id):
+    # stable under concurrent inserts and constant cost per page regardless
+    # of how deep the client has paged.
+    columns, descending = PRODUCT_SORTS[sort]
+    if after is not None:
+        cursor = decode_cursor(after)
+        last = [cursor.get(column.name) for column in columns]
+        if cursor.get("sort", "id") != sort or not all(isinstance(value, (int, float)) for value in last):
+            raise ValueError("Invalid pagination cursor")
+        if len(columns) == 1:
+            key, bound = columns[0], last[0]
+        else:
+            key, bound = tuple_(*columns), tuple_(*last)
+        query = query.where(key < bound if descending else key > bound)
+    query = query.order_by(*(column.desc() if descending else column for column in columns))
+    query = query.limit(limit + 1)
+
+    results = await database.fetch_all(query)
+    items = [_product_row(result) for result in results[:limit]]
+    next_cursor = None
+    if len(results) > limit:
+        next_cursor = encode_cursor({"sort": sort, **{column.name: items[-1][column.name] for column in columns}})
+    return {"items": items, "next_cursor": next_cursor}
+
+async def get_product(product_id: int):
+    cached = product_cache.get(product_id)
+    if cached is not None:
+        return cached
+
+    query = _product_query().where(products.c.id == product_id)
     
     result = await database.fetch_one(query)
     if result:
-        return {
-            **dict(result),
-            'category': {
-                'id': result['category_id'],
-                'name': result['category_name'],
-                'description': result['category_description'],
-                'image_url': result['category_image_url']
-            }
-        }
+        product = _product_row(result)
+        product_cache.set(product_id, product)
+        return product
     return None
 
-async def get_all_products():
-    query = select(
-        products,
-        categories.c.name.label('category_name'),
-        categories.c.description.label('category_description'),
-        categories.c.image_url.label('category_image_url')
-    ).join(categories)
-    
-    results = await database.fetch_all(query)
-    return [{
-        **dict(result),
-        'category': {
-            'id': result['category_id'],
-            'name': result['category_name'],
-            'description': result['category_description'],
-            'image_url': result['category_image_url']
-        }
-    } for result in results]
+async def get_products_by_ids(product_ids: List[int]):
+    """Fetch several products with one IN query, serving what it can from the cache.
 
-async def get_products_by_category(category_id: int):
-    query = select(
-        products,
-        categories.c.name.label('category_name'),
-        categories.c.description.label('category_description'),
-        categories.c.image_url.label('category_image_url')
-    ).join(categories).where(products.c.category_id == category_id)
-    
-    results = await database.fetch_all(query)
-    return [{
-        **dict(result),
-        'category': {
-            'id': result['category_id'],
-            'name': result['category_name'],
-            'description': result['category_description'],
-            'image_url': result['category_image_url']
-        }
-    } for result in results]
+    Products are returned in request order; unknown IDs are skipped.
+    """
+    found = {}
+    missing = []
+    for product_id in dict.fromkeys(product_ids):
+        cached = product_cache.get(product_id)
+        if cached is not None:
+            found[product_id] = cached
+        else:
+            missing.append(product_id)
+
+    if missing:
+        query = _product_query().where(products.c.id.in_(missing))
+        for result in await database.fetch_all(query):
+            product = _product_row(result)
+            product_cache.set(product["id"], product)
+            found[product["id"]] = product
+
+    return [found[product_id] for product_id in dict.fromkeys(product_ids) if product_id in found]
+
+async def get_all_products(
+    limit: int = settings.PAGE_SIZE_DEFAULT,
+    after: Optional[str] = None,
+    filters: Optional[ProductFilters] = None
+):
+    filters = filters or ProductFilters()
+    key = ("all", limit, after, tuple(filters.dict().items()))
+    cached = product_list_cache.get(key)
+    if cached is not None:
+        return cached
+
+    query = _filter_products(_product_query(), filters)
+    page = await _fetch_product_page(query, limit, after, filters.sort)
+    product_list_cache.set(key, page)
+    return page
+
+async def get_product_facets(filters: Optional[ProductFilters] = None):
+    """Count matching products per category and per price bucket in one aggregate query."""
+    filters = filters or ProductFilters()
+    key = ("facets", tuple(filters.dict().items()))
+    cached = product_list_cache.get(key)
+    if cached is not None:
+        return cached
+
+    price_bucket = case(
+        *[(products.c.price < bound, index) for index, bound in enumerate(PRICE_BUCKETS)],
+        else_=len(PRICE_BUCKETS)
+    ).label("price_bucket")
+    query = _filter_products(
+        select(products.c.category_id, categories.c.name, price_bucket, func.count().label("count"))
+        .select_from(products.join(categories)),
+        filters
+    ).group_by(products.c.category_id, categories.c.name, price_bucket)
+
+    category_counts = {}
+    bucket_counts = [0] * (len(PRICE_BUCKETS) + 1)
+    for row in await database.fetch_all(query):
+        category = category_counts.setdefault(
+            row["category_id"], {"category_id": row["category_id"], "name": row["name"], "count": 0}
+        )
+        category["count"] += row["count"]
+        bucket_counts[row["price_bucket"]] += row["count"]
+
+    bounds = (0, *PRICE_BUCKETS, None)
+    facets = {
+        "total": sum(bucket_counts),
+        "categories": sorted(category_counts.values(), key=lambda category: category["category_id"]),
+        "price_buckets": [
+            {"min_price": bounds[index], "max_price": bounds[index + 1], "count": count}
+            for index, count in enumerate(bucket_counts)
+        ],
+    }
+    product_list_cache.set(key, facets)
+    return facets
+
+async def get_products_by_category(
+    category_id: int,
+    limit: int = settings.PAGE_SIZE_DEFAULT,
+    after: Optional[str] = None
+):
+    key = ("category", category_id, limit, after)
+    cached = product_list_cache.get(key)
+    if cached is not None:
+        return cached
+
+    query = _product_query().where(products.c.category_id == category_id)
+    page = await _fetch_product_page(query, limit, after)
+    product_list_cache.set(key, page)
+    return page
+
+async def search_products(q: str, limit: int = settings.PAGE_SIZE_DEFAULT, after: Optional[str] = None):
+    # Results are ranked rather than ordered by ID, so the cursor carries an offset
+    offset = 0
+    if after is not None:
+        offset = decode_cursor(after).get("offset")
+        if not isinstance(offset, int) or offset < 0:
+            raise ValueError("Invalid pagination cursor")
+
+    query = apply_search(_product_query(), q)
+    if query is None:
+        return {"items": [], "next_cursor": None}
+
+    results = await database.fetch_all(query.limit(limit + 1).offset(offset))
+    items = [_product_row(result) for result in results[:limit]]
+    next_cursor = None
+    if len(results) > limit:
+        next_cursor = encode_cursor({"offset": offset + limit})
+    return {"items": items, "next_cursor": next_cursor}
 
 async def update_product(product_id: int, product: ProductUpdate):
     # Verify category exists
@@ -132,108 +312,292 @@ async def update_product(product_id: int, product: ProductUpdate):
     
     query = products.update().where(products.c.id == product_id).values(**product.dict())
     await database.execute(query)
+    invalidate_products(product_id)
     return await get_product(product_id)
 
 async def delete_product(product_id: int):
     query = products.delete().where(products.c.id == product_id)
-    return await database.execute(query)
+    result = await database.execute(query)
+    invalidate_products(product_id)
+    return result
 
 # Order operations
-async def create_order(user_id: int, order: OrderCreate):
-    # Start with 0 total amount
-    order_values = {
-        "user_id": user_id,
-        "status": "pending",
-        "total_amount": 0,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow()
-    }
+async def _place_order(user_id: int, items: List[OrderItemCreate]) -> int:
+    """Check and decrement stock, then insert the order; call inside a transaction.
+
+    Runs a constant number of statements. Raises ValueError, rolling the
+    caller's transaction back, if a product is missing or short of stock.
+    """
+    # Merge repeated lines so each product is checked and decremented once
+    quantities = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    product_ids = list(quantities)
     
-    # Create order
-    query = orders.insert().values(**order_values)
-    order_id = await database.execute(query)
+    rows = await database.fetch_all(
+        select(products.c.id, products.c.price, products.c.stock, products.c.category_id)
+        .where(products.c.id.in_(product_ids))
+    )
+    found = {row["id"]: row for row in rows}
+    for product_id in product_ids:
+        if product_id not in found:
+            raise ValueError(f"Product {product_id} not found")
+        if found[product_id]["stock"] < quantities[product_id]:
+            raise ValueError(f"Insufficient stock for product {product_id}")
     
-    total_amount = 0
-    # Create order items and calculate total
-    for item in order.items:
-        product = await get_product(item.product_id)
-        if not product:
-            raise ValueError(f"Product {item.product_id} not found")
-        if product["stock"] < item.quantity:
-            raise ValueError(f"Insufficient stock for product {item.product_id}")
-        
-        # Calculate item total
-        item_price = product["price"]
-        item_total = item_price * item.quantity
-        total_amount += item_total
-        
-        # Create order item
-        order_item_values = {
-            "order_id": order_id,
-            "product_id": item.product_id,
-            "quantity": item.quantity,
-            "price": item_price
-        }
-        await database.execute(order_items.insert().values(**order_item_values))
-        
-        # Update product stock
-        new_stock = product["stock"] - item.quantity
-        await database.execute(
-            products.update()
-            .where(products.c.id == item.product_id)
-            .values(stock=new_stock)
-        )
+    # Conditional decrement: rows that no longer have enough stock (a
+    # concurrent checkout got there first) are not updated or returned.
+    quantity = case(quantities, value=products.c.id)
+    decremented = await database.fetch_all(
+        products.update()
+        .where(products.c.id.in_(product_ids))
+        .where(products.c.stock >= quantity)
+        .values(stock=products.c.stock - quantity)
+        .returning(products.c.id)
+    )
+    if len(decremented) != len(product_ids):
+        sold_out = set(product_ids) - {row["id"] for row in decremented}
+        raise ValueError(f"Insufficient stock for product {min(sold_out)}")
     
-    # Update order with total amount
+    now = datetime.utcnow()
+    order_id = await database.execute(
+        orders.insert().values(
+            user_id=user_id,
+            status="pending",
+            total_amount=sum(
+                found[item.product_id]["price"] * item.quantity for item in items
+            ),
+            created_at=now,
+            updated_at=now
+        )
+    )
     await database.execute(
-        orders.update()
-        .where(orders.c.id == order_id)
-        .values(total_amount=total_amount)
+        order_items.insert().values([
+            {
+                "order_id": order_id,
+                "product_id": item.product_id,
+                "quantity": item.quantity,
+                "price": found[item.product_id]["price"],
+                "category_id": found[item.product_id]["category_id"]
+            }
+            for item in items
+        ])
     )
+    await record_order_sales(order_id, now, [
+        (item.product_id, found[item.product_id]["category_id"], item.quantity, found[item.product_id]["price"])
+        for item in items
+    ])
+    return order_id
+
+async def create_order(user_id: int, order: OrderCreate, idempotency_key: Optional[str] = None):
+    # One transaction: any failure rolls back the stock decrements and
+    # leaves no partial order behind. With an idempotency key the response
+    # is stored in the same transaction, so it exists exactly when the order does.
+    async with database.transaction():
+        order_id = await _place_order(user_id, order.items)
+        created = await get_order(order_id)
+        if idempotency_key is not None:
+            await store_response(user_id, idempotency_key, request_fingerprint(order.dict()), 200, created)
     
-    return await get_order(order_id)
+    invalidate_products(*{item.product_id for item in order.items})
+    return created
+
+ORDER_FIELDS = tuple(str(column.name) for column in orders.c)
+
+async def _attach_order_items(order_rows):
+    # One IN query for the items of every order, grouped in a single pass.
+    # Rows map positionally into the OrderOut / OrderItemOut shapes.
+    orders_by_id = {}
+    for row in order_rows:
+        order = dict(zip(ORDER_FIELDS, tuple(row._mapping)))
+        order["items"] = []
+        orders_by_id[order["id"]] = order
+    if orders_by_id:
+        items_query = (
+            select(
+                order_items.c.order_id, order_items.c.id, order_items.c.product_id,
+                order_items.c.quantity, order_items.c.price
+            )
+            .where(order_items.c.order_id.in_(list(orders_by_id)))
+            .order_by(order_items.c.id)
+        )
+        for item in await database.fetch_all(items_query):
+            order_id, item_id, product_id, quantity, price = item._mapping
+            orders_by_id[order_id]["items"].append(
+                {"id": item_id, "product_id": product_id, "quantity": quantity, "price": price}
+            )
+    return list(orders_by_id.values())
 
 async def get_order(order_id: int):
-    # Get order
     order_query = orders.select().where(orders.c.id == order_id)
     order = await database.fetch_one(order_query)
     if not order:
         return None
     
-    # Get order items
-    items_query = order_items.select().where(order_items.c.order_id == order_id)
-    items = await database.fetch_all(items_query)
-    
-    return {**dict(order), "items": [dict(item) for item in items]}
+    return (await _attach_order_items([order]))[0]
 
 
-async def get_user_orders(user_id: int):
-    # Get all orders for the user
+async def get_user_orders(
+    user_id: int,
+    limit: int = settings.PAGE_SIZE_DEFAULT,
+    before: Optional[int] = None
+):
+    # Newest first; pass the last order ID of a page as `before` to get the next one
     query = orders.select().where(orders.c.user_id == user_id)
-    user_orders = await database.fetch_all(query)
+    if before is not None:
+        query = query.where(orders.c.id < before)
+    query = query.order_by(orders.c.id.desc()).limit(limit)
     
-    # For each order, get its items
-    result = []
-    for order in user_orders:
-        # Get order items
-        items_query = order_items.select().where(order_items.c.order_id == order.id)
-        items = await database.fetch_all(items_query)
-        
-        # Convert to dict and ensure datetime fields are properly formatted
-        order_dict = dict(order)
-        order_dict["created_at"] = order_dict["created_at"].isoformat() if order_dict["created_at"] else None
-        order_dict["updated_at"] = order_dict["updated_at"].isoformat() if order_dict["updated_at"] else None
-        order_dict["items"] = [dict(item) for item in items]
-        
-        result.append(order_dict)
-    
-    return result
+    user_orders = await database.fetch_all(query)
+    return await _attach_order_items(user_orders)
+
+def _filter_orders(query, filters: AdminOrderFilters):
+    if filters.status is not None:
+        query = query.where(orders.c.status == filters.status)
+    if filters.user_id is not None:
+        query = query.where(orders.c.user_id == filters.user_id)
+    if filters.created_from is not None:
+        query = query.where(orders.c.created_at >= filters.created_from)
+    if filters.created_to is not None:
+        query = query.where(orders.c.created_at < filters.created_to)
+    return query
+
+async def get_admin_orders(
+    limit: int = settings.PAGE_SIZE_DEFAULT,
+    after: Optional[str] = None,
+    filters: Optional[AdminOrderFilters] = None
+):
+    """All users' orders, newest first, keyset-paginated on (created_at, id)."""
+    query = _filter_orders(orders.select(), filters or AdminOrderFilters())
+    if after is not None:
+        cursor = decode_cursor(after)
+        try:
+            created_at = datetime.fromisoformat(cursor["created_at"])
+            order_id = int(cursor["id"])
+        except (KeyError, TypeError, ValueError):
+            raise ValueError("Invalid pagination cursor")
+        query = query.where(tuple_(orders.c.created_at, orders.c.id) < (created_at, order_id))
+    query = query.order_by(orders.c.created_at.desc(), orders.c.id.desc()).limit(limit + 1)
+
+    results = await database.fetch_all(query)
+    items = await _attach_order_items(results[:limit])
+    next_cursor = None
+    if len(results) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor({"created_at": last["created_at"].isoformat(), "id": last["id"]})
+    return {"items": items, "next_cursor": next_cursor}
+
+async def count_admin_orders(filters: Optional[AdminOrderFilters] = None) -> int:
+    query = _filter_orders(select(func.count()).select_from(orders), filters or AdminOrderFilters())
+    return await database.fetch_val(query)
 
 # Update order status
 async def update_order_status(order_id: int, status: str):
-    query = orders.update().where(orders.c.id == order_id).values(
-        status=status,
-        updated_at=datetime.utcnow()
+    async with database.transaction():
+        current = await database.fetch_one(
+            select(orders.c.status, orders.c.created_at)
+            .where(orders.c.id == order_id)
+            .with_for_update()
+        )
+        query = orders.update().where(orders.c.id == order_id).values(
+            status=status,
+            updated_at=datetime.utcnow()
+        )
+        await database.execute(query)
+        # Cancelling takes the order out of the sales rollups; reinstating puts it back
+        if current and counts_toward_sales(current["status"]) != counts_toward_sales(status):
+            sign = 1 if counts_toward_sales(status) else -1
+            await record_order_sales(order_id, current["created_at"], await order_sales_items(order_id), sign)
+    return await get_order(order_id)
+
+# Cart operations
+async def get_cart(user_id: int):
+    rows = await database.fetch_all(
+        select(cart_items.c.product_id, cart_items.c.quantity)
+        .where(cart_items.c.user_id == user_id)
+        .order_by(cart_items.c.added_at, cart_items.c.product_id)
     )
-    await database.execute(query)
+    return [dict(zip(("product_id", "quantity"), row._mapping)) for row in rows]
+
+async def set_cart_item(user_id: int, product_id: int, quantity: int):
+    if not await get_product(product_id):
+        raise ValueError(f"Product {product_id} not found")
+    statement = upsert(cart_items).values(
+        user_id=user_id, product_id=product_id, quantity=quantity, added_at=datetime.utcnow()
+    )
+    await database.execute(statement.on_conflict_do_update(
+        index_elements=[cart_items.c.user_id, cart_items.c.product_id],
+        set_={"quantity": statement.excluded.quantity}
+    ))
+    return {"product_id": product_id, "quantity": quantity}
+
+async def remove_cart_item(user_id: int, product_id: int):
+    await database.execute(
+        cart_items.delete()
+        .where(cart_items.c.user_id == user_id)
+        .where(cart_items.c.product_id == product_id)
+    )
+
+async def clear_cart(user_id: int):
+    await database.execute(cart_items.delete().where(cart_items.c.user_id == user_id))
+
+async def get_cart_quote(user_id: int):
+    # One query prices every line against the current catalog; the outer
+    # join keeps lines whose product has since been deleted.
+    rows = await database.fetch_all(
+        select(
+            cart_items.c.product_id, cart_items.c.quantity,
+            products.c.name, products.c.price, products.c.stock
+        )
+        .select_from(cart_items.outerjoin(products, products.c.id == cart_items.c.product_id))
+        .where(cart_items.c.user_id == user_id)
+        .order_by(cart_items.c.added_at, cart_items.c.product_id)
+    )
+    lines = []
+    total = 0.0
+    unavailable = []
+    for product_id, quantity, name, price, stock in (row._mapping for row in rows):
+        line = {
+            "product_id": product_id, "quantity": quantity, "name": name, "price": price,
+            "stock": stock or 0, "line_total": 0.0, "available": True, "reason": None
+        }
+        if name is None:
+            line["available"], line["reason"] = False, "Product no longer exists"
+        else:
+            line["line_total"] = round(price * quantity, 2)
+            total += price * quantity
+            if stock < quantity:
+                line["available"] = False
+                line["reason"] = f"Only {stock} in stock" if stock else "Out of stock"
+        if not line["available"]:
+            unavailable.append(product_id)
+        lines.append(line)
+    return {
+        "items": lines,
+        "total": round(total, 2),
+        "unavailable": unavailable,
+        "can_checkout": bool(lines) and not unavailable,
+    }
+
+async def checkout_cart(user_id: int):
+    """Turn the user's cart into an order and empty it, in one transaction."""
+    async with database.transaction():
+        # Locks the lines so a concurrent checkout of the same cart waits
+        # and then finds it empty
+        rows = await database.fetch_all(
+            select(cart_items.c.product_id, cart_items.c.quantity)
+            .where(cart_items.c.user_id == user_id)
+            .order_by(cart_items.c.added_at, cart_items.c.product_id)
+            .with_for_update()
+        )
+        if not rows:
+            raise ValueError("Cart is empty")
+        items = [
+            OrderItemCreate(product_id=product_id, quantity=quantity)
+            for product_id, quantity in (row._mapping for row in rows)
+        ]
+        order_id = await _place_order(user_id, items)
+        await database.execute(cart_items.delete().where(cart_items.c.user_id == user_id))
+    
+    invalidate_products(*{item.product_id for item in items})
     return await get_order(order_id)
@@ -1,9 +1,153 @@
+import logging
 import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
 from databases import Database
 from dotenv import load_dotenv
 from .config import settings
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger(__name__ + ".slow")
+
+class QueryStats:
+    """Statements executed while serving one request."""
+
+    __slots__ = ("count", "total_seconds", "slowest_seconds", "slowest_query", "shapes")
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.slowest_seconds = 0.0
+        self.slowest_query = None
+        self.shapes = Counter()
+
+# Stats for the request being served, set by ServerTimingMiddleware
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+def _statement_shape(query):
+    # SQLAlchemy's structural cache key ignores bound values, so the same
+    # statement with different parameters has the same shape; it is far
+    # cheaper than compiling the statement to SQL text.
+    if isinstance(query, str):
+        return query
+    cache_key = query._generate_cache_key()
+    return cache_key.key if cache_key is not None else str(query)
+
+class InstrumentedDatabase:
+    """Wraps a ``databases.Database`` and records timing for every statement.
+
+    Statements slower than ``DB_SLOW_QUERY_MS`` go to the slow-query log, and a
+    statement shape running more than ``DB_REPEATED_QUERY_THRESHOLD`` times in
+    one request is reported as a likely N+1.
+    """
+
+    def __init__(self, database: Database):
+        self._database = database
+        self.slow_query_seconds = settings.DB_SLOW_QUERY_MS / 1000
+        self.repeated_query_threshold = settings.DB_REPEATED_QUERY_THRESHOLD
+
+    def __getattr__(self, name):
+        return getattr(self._database, name)
+
+    def _record(self, query, seconds: float):
+        if seconds >= self.slow_query_seconds:
+            slow_query_logger.warning("Slow query (%.1f ms): %s", seconds * 1000, query)
+
+        stats = current_query_stats.get()
+        if stats is None:
+            return
+        stats.count += 1
+        stats.total_seconds += seconds
+        if seconds > stats.slowest_seconds:
+            stats.slowest_seconds = seconds
+            stats.slowest_query = query
+        shape = _statement_shape(query)
+        stats.shapes[shape] += 1
+        if stats.shapes[shape] == self.repeated_query_threshold + 1:
+            logger.warning(
+                "Statement ran more than %d times in one request (possible N+1): %s",
+                self.repeated_query_threshold, query
+            )
+
+    async def execute(self, query, values: Optional[dict] = None):
+        start = time.perf_counter()
+        try:
+            return await self._database.execute(query, values)
+        finally:
+            self._record(query, time.perf_counter() - start)
+
+    async def execute_many(self, query, values: list):
+        start = time.perf_counter()
+        try:
+            return await self._database.execute_many(query, values)
+        finally:
+            self._record(query, time.perf_counter() - start)
+
+    async def executemany_raw(self, sql: str, rows: list):
+        """Run ``sql`` for every tuple in ``rows`` through the driver's own executemany.
+
+        ``execute_many`` compiles and executes one statement per row; this sends
+        pre-rendered SQL once, for bulk loads. ``sql`` must use the driver's
+        placeholder style, and the call must happen inside ``transaction()`` so
+        a connection is held.
+        """
+        start = time.perf_counter()
+        try:
+            await self._database.connection().raw_connection.executemany(sql, rows)
+        finally:
+            self._record(sql, time.perf_counter() - start)
+
+    async def fetch_all(self, query, values: Optional[dict] = None):
+        start = time.perf_counter()
+        try:
+            return await self._database.fetch_all(query, values)
+        finally:
+            self._record(query, time.perf_counter() - start)
+
+    async def fetch_one(self, query, values: Optional[dict] = None):
+        start = time.perf_counter()
+        try:
+            return await self._database.fetch_one(query, values)
+        finally:
+            self._record(query, time.perf_counter() - start)
+
+    async def fetch_val(self, query, values: Optional[dict] = None, column=0):
+        start = time.perf_counter()
+        try:
+            return await self._database.fetch_val(query, values, column)
+        finally:
+            self._record(query, time.perf_counter() - start)
+
+    async def iterate(self, query, values: Optional[dict] = None):
+        # Only time spent waiting on the database counts, not the consumer's work
+        elapsed = 0.0
+        rows = self._database.iterate(query, values).__aiter__()
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    row = await rows.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    elapsed += time.perf_counter() - start
+                yield row
+        finally:
+            self._record(query, elapsed)
+
 DATABASE_URL = os.getenv("DATABASE_URL")
-database = Database(settings.DATABASE_URL)
\ No newline at end of file
+database = InstrumentedDatabase(Database(settings.DATABASE_URL))
+
+# The few statements that differ between backends (upserts, raw SQL
+# placeholders, full-text search) branch on this
+IS_SQLITE = settings.DATABASE_URL.startswith("sqlite")
+
+# INSERT ... ON CONFLICT for the configured backend
+if IS_SQLITE:
+    from sqlalchemy.dialects.sqlite import insert as upsert
+else:
+    from sqlalchemy.dialects.postgresql import insert as upsert
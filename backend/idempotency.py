@@ -0,0 +1,136 @@
+"""
+Idempotency keys for order creation.
+
+A client that sends ``Idempotency-Key`` with ``POST /orders`` can retry it
+safely. The first successful response is stored in ``idempotency_keys`` in
+the same transaction as the order, for ``IDEMPOTENCY_KEY_TTL_SECONDS``.
+Retries with that key replay the stored body without touching products or
+stock. Keys are scoped to the user who sent them.
+
+Duplicates that arrive while the first request is still running wait for it
+in-process rather than running alongside it. A duplicate on another worker
+loses the race on the primary key when it stores its response; its order is
+rolled back and the winner's response is replayed instead.
+
+Failed requests are not stored: they changed nothing, so a retry simply
+runs again. Expired keys are dropped when reused, or in bulk with:
+
+    python -m backend.idempotency   # delete expired idempotency keys
+"""
+
+import asyncio
+import hashlib
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, Tuple
+
+from fastapi import Response
+from sqlalchemy import select
+
+from .config import settings
+from .database import database
+from .models import idempotency_keys
+from .serialization import dumps, json_response
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+# (user ID, key) -> set once the request holding that key has finished
+_in_flight: Dict[Tuple[int, str], asyncio.Event] = {}
+
+class IdempotencyKeyReused(ValueError):
+    """The key was first used with a different request body."""
+
+def request_fingerprint(payload) -> str:
+    return hashlib.blake2b(dumps(payload), digest_size=16).hexdigest()
+
+async def store_response(user_id: int, key: str, fingerprint: str, status_code: int, content):
+    """Record the response for a key; call inside the transaction that produced it.
+
+    Raises the driver's integrity error if another worker stored the key first.
+    """
+    now = datetime.utcnow()
+    await database.execute(idempotency_keys.insert().values(
+        user_id=user_id,
+        key=key,
+        fingerprint=fingerprint,
+        status_code=status_code,
+        body=dumps(content).decode(),
+        created_at=now,
+        expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL_SECONDS)
+    ))
+
+async def _stored_response(user_id: int, key: str, fingerprint: str):
+    row = await database.fetch_one(
+        select(
+            idempotency_keys.c.fingerprint, idempotency_keys.c.status_code,
+            idempotency_keys.c.body, idempotency_keys.c.expires_at
+        )
+        .where(idempotency_keys.c.user_id == user_id)
+        .where(idempotency_keys.c.key == key)
+    )
+    if row is None:
+        return None
+    stored_fingerprint, status_code, body, expires_at = row._mapping
+    if expires_at <= datetime.utcnow():
+        # Free the key for this request's own response
+        await database.execute(
+            idempotency_keys.delete()
+            .where(idempotency_keys.c.user_id == user_id)
+            .where(idempotency_keys.c.key == key)
+            .where(idempotency_keys.c.expires_at == expires_at)
+        )
+        return None
+    if stored_fingerprint != fingerprint:
+        raise IdempotencyKeyReused("Idempotency-Key was already used with a different request")
+    return Response(
+        content=body,
+        status_code=status_code,
+        media_type="application/json",
+        headers={REPLAYED_HEADER: "true"}
+    )
+
+async def run_idempotent(
+    user_id: int,
+    key: str,
+    fingerprint: str,
+    run: Callable[[], Awaitable[object]]
+) -> Response:
+    """Replay the stored response for a key, or run the request once and return its result.
+
+    ``run`` must call ``store_response`` in its transaction.
+    """
+    slot = (user_id, key)
+    while slot in _in_flight:
+        await _in_flight[slot].wait()
+
+    # Claimed before the first await, so later duplicates queue behind us
+    done = _in_flight[slot] = asyncio.Event()
+    try:
+        stored = await _stored_response(user_id, key, fingerprint)
+        if stored is not None:
+            return stored
+        return json_response(await run())
+    except Exception:
+        # Another worker may have stored this key first and rolled us back
+        stored = await _stored_response(user_id, key, fingerprint)
+        if stored is not None:
+            return stored
+        raise
+    finally:
+        del _in_flight[slot]
+        done.set()
+
+async def purge_expired() -> None:
+    await database.execute(
+        idempotency_keys.delete().where(idempotency_keys.c.expires_at <= datetime.utcnow())
+    )
+
+async def _main():
+    await database.connect()
+    try:
+        await purge_expired()
+    finally:
+        await database.disconnect()
+
+if __name__ == "__main__":
+    asyncio.run(_main())
+    print("Expired idempotency keys deleted successfully!")
@@ -0,0 +1,111 @@
+"""
+Logging setup: structured JSON lines written by a background thread.
+Request handlers only put records on a queue, so a slow stderr never blocks the
+event loop, and messages are formatted by the writer thread rather than the caller.
+"""
+
+import json
+import logging
+import queue
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional
+
+from .config import settings
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "sampled_out", 0):
+            entry["sampled_out"] = record.sampled_out
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+class DeferredFormattingQueueHandler(QueueHandler):
+    """Queues records as-is; the listener thread does all message formatting."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+class SamplingFilter(logging.Filter):
+    """Lets through at most ``per_second`` records per message template from the given loggers.
+
+    Records from other loggers always pass. The next sampled record that gets
+    through carries the number dropped since the previous one in ``sampled_out``.
+    """
+
+    def __init__(self, per_second: float, loggers: List[str]):
+        super().__init__()
+        self.per_second = per_second
+        self.loggers = tuple(loggers)
+        self.prefixes = tuple(name + "." for name in loggers)
+        self._buckets: Dict[tuple, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.name not in self.loggers and not record.name.startswith(self.prefixes):
+            return True
+        now = time.monotonic()
+        key = (record.name, record.msg)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [self.per_second, now, 0]  # tokens, updated, dropped
+        tokens = min(self.per_second, bucket[0] + (now - bucket[1]) * self.per_second)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            bucket[2] += 1
+            return False
+        bucket[0] = tokens - 1
+        record.sampled_out = bucket[2]
+        bucket[2] = 0
+        return True
+
+def _parse_levels(spec: str) -> Dict[str, str]:
+    # "backend.auth=WARNING,backend.database=INFO"
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+_listener: Optional[QueueListener] = None
+
+def configure_logging():
+    """Route all logging through a queue to a background JSON writer; idempotent."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stderr)
+    stream_handler.setFormatter(JsonFormatter())
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    queue_handler = DeferredFormattingQueueHandler(log_queue)
+    sampled = [name.strip() for name in settings.LOG_SAMPLED_LOGGERS.split(",") if name.strip()]
+    queue_handler.addFilter(SamplingFilter(settings.LOG_SAMPLE_PER_SECOND, sampled))
+    root.addHandler(queue_handler)
+    root.setLevel(settings.LOG_LEVEL.upper())
+
+    for name, level in _parse_levels(settings.LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener.start()
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,37 +1,70 @@
-from fastapi import FastAPI, Depends, HTTPException, Header, Path, status
+from fastapi import FastAPI, Depends, HTTPException, Header, Path, Query, Request, Response, status
+import asyncio
+from contextlib import asynccontextmanager
 from .database import database
-from .models import metadata
 from .config import settings
+from .cache import cache_stats, catalog_etag
+from .logging_config import configure_logging, shutdown_logging
 from .crud import (
     create_user, create_product, get_product, get_all_products,
     update_product, delete_product, create_order, get_order,
     get_user_orders, update_order_status, create_category,
-    get_category, get_all_categories, update_category,
-    delete_category, get_products_by_category
+    get_category, get_all_categories, update_category, update_user,
+    delete_category, get_products_by_category, get_products_by_ids,
+    search_products, get_product_facets, get_admin_orders, count_admin_orders,
+    get_cart, set_cart_item, remove_cart_item, clear_cart, get_cart_quote, checkout_cart
 )
 from .schemas import (
     UserCreate, UserLogin, UserOut,
-    ProductCreate, ProductUpdate, ProductOut,
-    OrderCreate, OrderOut, CategoryCreate,
-    CategoryUpdate, CategoryOut
+    ProductCreate, ProductUpdate, ProductOut, ProductPage, ProductBatchRequest,
+    ProductFilters, ProductFacets, ProductImportReport,
+    OrderCreate, OrderOut, OrderPage, OrderCount, AdminOrderFilters, SalesAnalytics, CategoryCreate,
+    CategoryUpdate, CategoryOut, CartItemUpdate, CartItemOut, CartQuote
 )
-from .auth import create_access_token, verify_access_token, get_current_user, get_user_by_email
-from .utils import verify_password
-from .middleware import rate_limit_middleware
+from .auth import create_access_token, verify_access_token, get_current_user, get_user_by_email, revoke_token
+from .utils import password_hasher
+from .middleware import RateLimitMiddleware, ServerTimingMiddleware
+from .metrics import MetricsMiddleware, registry as metrics_registry
+from .serialization import json_response
+from .compression import CompressionMiddleware, base_etag
+from .analytics import get_analytics
+from .idempotency import IdempotencyKeyReused, request_fingerprint, run_idempotent
+from .bulk import EXPORT_FORMATS, IMPORT_FORMATS, export_table, import_products
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine
-from typing import List
-from fastapi.responses import JSONResponse
+from datetime import date
+from typing import List, Optional
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.exceptions import RequestValidationError
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    # Schema DDL is normally a separate deploy step (python -m backend.create_tables)
+    if settings.CREATE_TABLES_ON_STARTUP:
+        from .create_tables import create_tables
+        await asyncio.to_thread(create_tables)
+    await database.connect()
+    try:
+        yield
+    finally:
+        await database.disconnect()
+        shutdown_logging()
+
 app = FastAPI(
     title="E-commerce API",
     version="1.0.0",
-    description="A modern e-commerce API with authentication and product management"
+    description="A modern e-commerce API with authentication and product management",
+    lifespan=lifespan
 )
 
+# Per-request query counts and timings, reported as Server-Timing headers
+app.add_middleware(ServerTimingMiddleware)
+
+# Gzip (or zstd/brotli when installed) for larger text responses
+app.add_middleware(CompressionMiddleware)
+
 # Adding rate limiting middleware
-app.add_middleware(rate_limit_middleware)
+app.add_middleware(RateLimitMiddleware)
 
 # Configuring CORS
 app.add_middleware(
@@ -42,17 +75,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Database setup
-engine = create_engine(settings.DATABASE_URL)
-metadata.create_all(engine)
-
-@app.on_event("startup")
-async def startup():
-    await database.connect()
-
-@app.on_event("shutdown")
-async def shutdown():
-    await database.disconnect()
+# Request metrics; added last so it is outermost and also sees rate-limited requests
+app.add_middleware(MetricsMiddleware)
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request, exc):
@@ -61,6 +85,51 @@ async def validation_exception_handler(request, exc):
         content={"detail": exc.errors()}
     )
 
+# Conditional GET for the public catalog; ETags change whenever products or categories do
+CATALOG_CACHE_CONTROL = f"public, max-age={settings.CATALOG_MAX_AGE}, must-revalidate"
+
+class NotModified(Exception):
+    def __init__(self, etag: str):
+        self.etag = etag
+
+@app.exception_handler(NotModified)
+async def not_modified_handler(request, exc):
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": exc.etag, "Cache-Control": CATALOG_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+    )
+
+def matching_etag(if_none_match: Optional[str], etag: str) -> Optional[str]:
+    """Return the client's tag that matches ``etag``, ignoring any compression suffix.
+
+    ``*`` is not honoured: the check runs before the endpoint has looked the
+    resource up, so it would turn a 404 into a 304.
+    """
+    if not if_none_match:
+        return None
+    for tag in if_none_match.split(","):
+        tag = tag.strip().removeprefix("W/")
+        if base_etag(tag) == etag:
+            return tag
+    return None
+
+async def catalog_conditional(request: Request, response: Response):
+    """Short-circuit with 304 before the endpoint runs if the client's copy is current."""
+    resource = request.url.path
+    if request.url.query:
+        resource += "?" + request.url.query
+    etag = catalog_etag(resource)
+    matched = matching_etag(request.headers.get("if-none-match"), etag)
+    if matched:
+        # Echo the tag the client holds, which names the encoding it was sent in
+        raise NotModified(matched)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = CATALOG_CACHE_CONTROL
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # Auth endpoints
 @app.post("/register", response_model=UserOut, status_code=status.HTTP_201_CREATED)
 async def register(user: UserCreate, is_admin: bool = False):
@@ -75,11 +144,20 @@ async def register(user: UserCreate, is_admin: bool = False):
 @app.post("/login", status_code=status.HTTP_200_OK)
 async def login(user: UserLogin):
     db_user = await get_user_by_email(user.email)
-    if not db_user or not verify_password(user.password, db_user["hashed_password"]):
+    if not db_user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials"
         )
+    valid, new_hash = await password_hasher.verify_and_update(user.password, db_user["hashed_password"])
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid credentials"
+        )
+    if new_hash:
+        # Stored hash used a different bcrypt cost; upgrade it transparently
+        await update_user(db_user["id"], hashed_password=new_hash)
     token = create_access_token({"user_id": db_user["id"], "email": db_user["email"]})
     return {
         "access_token": token,
@@ -94,6 +172,7 @@ async def get_me(current_user: dict = Depends(get_current_user)):
 async def logout(authorization: str = Header(None)):
     if not authorization or not authorization.startswith("Bearer "):
         raise HTTPException(status_code=401, detail="Missing or invalid token")
+    await revoke_token(authorization[len("Bearer "):])
     return {"message": "Successfully logged out"}
 
 # Product endpoints
@@ -106,18 +185,47 @@ async def add_product(
         raise HTTPException(status_code=403, detail="Only admins can add products")
     return await create_product(product)
 
-@app.get("/products", response_model=List[ProductOut])
-async def list_products():
-    return await get_all_products()
+@app.get("/products", response_model=ProductPage, dependencies=[Depends(catalog_conditional)])
+async def list_products(
+    response: Response,
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    after: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    filters: ProductFilters = Depends()
+):
+    try:
+        return json_response(await get_all_products(limit, after, filters), response)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/products/facets", response_model=ProductFacets, dependencies=[Depends(catalog_conditional)])
+async def list_product_facets(filters: ProductFilters = Depends()):
+    return await get_product_facets(filters)
+
+@app.post("/products/batch", response_model=List[ProductOut])
+async def get_product_batch(batch: ProductBatchRequest):
+    return json_response(await get_products_by_ids(batch.ids))
 
-@app.get("/products/{product_id}", response_model=ProductOut)
+@app.get("/products/search", response_model=ProductPage, dependencies=[Depends(catalog_conditional)])
+async def search_product_catalog(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200, description="Words to match in product name and description"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    after: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page")
+):
+    try:
+        return json_response(await search_products(q, limit, after), response)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/products/{product_id}", response_model=ProductOut, dependencies=[Depends(catalog_conditional)])
 async def get_single_product(
+    response: Response,
     product_id: int = Path(..., title="The ID of the product to get")
 ):
     product = await get_product(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
+    return json_response(product, response)
 
 @app.put("/products/{product_id}", response_model=ProductOut)
 async def update_single_product(
@@ -149,10 +257,20 @@ async def delete_single_product(
 @app.post("/orders", response_model=OrderOut)
 async def create_new_order(
     order: OrderCreate,
+    idempotency_key: Optional[str] = Header(None, min_length=1, max_length=255),
     current_user: dict = Depends(get_current_user)
 ):
     try:
-        return await create_order(current_user["id"], order)
+        if idempotency_key is None:
+            return await create_order(current_user["id"], order)
+        return await run_idempotent(
+            current_user["id"],
+            idempotency_key,
+            request_fingerprint(order.dict()),
+            lambda: create_order(current_user["id"], order, idempotency_key)
+        )
+    except IdempotencyKeyReused as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -166,11 +284,15 @@ async def get_single_order(
         raise HTTPException(status_code=404, detail="Order not found")
     if order["user_id"] != current_user["id"] and not current_user["is_admin"]:
         raise HTTPException(status_code=403, detail="Not authorized to view this order")
-    return order
+    return json_response(order)
 
 @app.get("/orders", response_model=List[OrderOut])
-async def list_user_orders(current_user: dict = Depends(get_current_user)):
-    return await get_user_orders(current_user["id"])
+async def list_user_orders(
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    before: Optional[int] = Query(None, gt=0, description="Return orders older than this order ID"),
+    current_user: dict = Depends(get_current_user)
+):
+    return json_response(await get_user_orders(current_user["id"], limit, before))
 
 @app.put("/orders/{order_id}/status")
 async def update_order_status_endpoint(
@@ -187,6 +309,46 @@ async def update_order_status_endpoint(
         raise HTTPException(status_code=400, detail="Invalid status")
     return await update_order_status(order_id, status)
 
+# Cart endpoints
+@app.get("/cart", response_model=List[CartItemOut])
+async def get_user_cart(current_user: dict = Depends(get_current_user)):
+    return await get_cart(current_user["id"])
+
+@app.get("/cart/quote", response_model=CartQuote)
+async def quote_user_cart(current_user: dict = Depends(get_current_user)):
+    return await get_cart_quote(current_user["id"])
+
+@app.put("/cart/items/{product_id}", response_model=CartItemOut)
+async def set_user_cart_item(
+    item: CartItemUpdate,
+    product_id: int = Path(..., gt=0),
+    current_user: dict = Depends(get_current_user)
+):
+    try:
+        return await set_cart_item(current_user["id"], product_id, item.quantity)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.delete("/cart/items/{product_id}")
+async def remove_user_cart_item(
+    product_id: int = Path(..., gt=0),
+    current_user: dict = Depends(get_current_user)
+):
+    await remove_cart_item(current_user["id"], product_id)
+    return {"message": "Item removed from cart"}
+
+@app.delete("/cart")
+async def clear_user_cart(current_user: dict = Depends(get_current_user)):
+    await clear_cart(current_user["id"])
+    return {"message": "Cart cleared"}
+
+@app.post("/cart/checkout", response_model=OrderOut)
+async def checkout_user_cart(current_user: dict = Depends(get_current_user)):
+    try:
+        return await checkout_cart(current_user["id"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # Category endpoints
 @app.post("/categories", response_model=CategoryOut)
 async def add_category(
@@ -197,11 +359,11 @@ async def add_category(
         raise HTTPException(status_code=403, detail="Only admins can add categories")
     return await create_category(category)
 
-@app.get("/categories", response_model=List[CategoryOut])
+@app.get("/categories", response_model=List[CategoryOut], dependencies=[Depends(catalog_conditional)])
 async def list_categories():
     return await get_all_categories()
 
-@app.get("/categories/{category_id}", response_model=CategoryOut)
+@app.get("/categories/{category_id}", response_model=CategoryOut, dependencies=[Depends(catalog_conditional)])
 async def get_single_category(
     category_id: int = Path(..., title="The ID of the category to get")
 ):
@@ -210,14 +372,20 @@ async def get_single_category(
         raise HTTPException(status_code=404, detail="Category not found")
     return category
 
-@app.get("/categories/{category_id}/products", response_model=List[ProductOut])
+@app.get("/categories/{category_id}/products", response_model=ProductPage, dependencies=[Depends(catalog_conditional)])
 async def get_category_products(
-    category_id: int = Path(..., title="The ID of the category to get products for")
+    response: Response,
+    category_id: int = Path(..., title="The ID of the category to get products for"),
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    after: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page")
 ):
     category = await get_category(category_id)
     if not category:
         raise HTTPException(status_code=404, detail="Category not found")
-    return await get_products_by_category(category_id)
+    try:
+        return json_response(await get_products_by_category(category_id, limit, after), response)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.put("/categories/{category_id}", response_model=CategoryOut)
 async def update_single_category(
@@ -243,4 +411,81 @@ async def delete_single_category(
     if not existing_category:
         raise HTTPException(status_code=404, detail="Category not found")
     await delete_category(category_id)
-    return {"message": "Category deleted successfully"}
\ No newline at end of file
+    return {"message": "Category deleted successfully"}
+
+# Admin endpoints
+@app.get("/admin/orders", response_model=OrderPage)
+async def list_all_orders(
+    limit: int = Query(settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX),
+    after: Optional[str] = Query(None, description="Cursor returned as next_cursor by the previous page"),
+    filters: AdminOrderFilters = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user["is_admin"]:
+        raise HTTPException(status_code=403, detail="Only admins can list all orders")
+    try:
+        return json_response(await get_admin_orders(limit, after, filters))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/orders/count", response_model=OrderCount)
+async def count_all_orders(
+    filters: AdminOrderFilters = Depends(),
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user["is_admin"]:
+        raise HTTPException(status_code=403, detail="Only admins can count orders")
+    return {"count": await count_admin_orders(filters)}
+
+@app.get("/admin/analytics", response_model=SalesAnalytics)
+async def get_sales_analytics(
+    dimension: str = Query("day", pattern="^(day|category|product)$"),
+    limit: int = Query(30, ge=1, le=settings.PAGE_SIZE_MAX),
+    start: Optional[date] = Query(None, description="First day to include (day dimension only)"),
+    end: Optional[date] = Query(None, description="Last day to include (day dimension only)"),
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user["is_admin"]:
+        raise HTTPException(status_code=403, detail="Only admins can view analytics")
+    return await get_analytics(dimension, limit, start, end)
+
+@app.get("/admin/cache-stats")
+async def get_cache_stats(current_user: dict = Depends(get_current_user)):
+    if not current_user["is_admin"]:
+        raise HTTPException(status_code=403, detail="Only admins can view cache statistics")
+    return cache_stats()
+
+@app.post("/admin/products/import", response_model=ProductImportReport)
+async def import_product_feed(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Defaults to the request Content-Type"),
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user["is_admin"]:
+        raise HTTPException(status_code=403, detail="Only admins can import products")
+    if format is None:
+        content_type = request.headers.get("content-type", "")
+        format = next((fmt for fmt, media_type in IMPORT_FORMATS.items() if content_type.startswith(media_type)), None)
+    if format is None:
+        raise HTTPException(
+            status_code=415,
+            detail="Send text/csv or application/x-ndjson, or pass ?format=csv|ndjson"
+        )
+    try:
+        return await import_products(request.stream(), format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/admin/export/{table}")
+async def export_table_dump(
+    table: str = Path(..., pattern="^(orders|order_items|products)$"),
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user["is_admin"]:
+        raise HTTPException(status_code=403, detail="Only admins can export data")
+    return StreamingResponse(
+        export_table(table, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    )
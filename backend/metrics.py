@@ -0,0 +1,135 @@
+"""
+Per-route request metrics, exposed in Prometheus text format.
+Counters are plain per-worker integers: every update happens on the event loop
+thread, so no locking is needed and recording costs a few dict lookups.
+"""
+
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from .cache import cache_stats
+from .utils import password_hasher
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RouteMetrics:
+    __slots__ = ("statuses", "buckets", "latency_sum", "count")
+
+    def __init__(self):
+        self.statuses: Dict[int, int] = defaultdict(int)
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # last slot is +Inf
+        self.latency_sum = 0.0
+        self.count = 0
+
+    def observe(self, status_code: int, seconds: float):
+        self.statuses[status_code] += 1
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.latency_sum += seconds
+        self.count += 1
+
+class MetricsRegistry:
+    def __init__(self):
+        self.routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self.in_flight = 0
+
+    def observe(self, method: str, route: str, status_code: int, seconds: float):
+        key = (method, route)
+        metrics = self.routes.get(key)
+        if metrics is None:
+            metrics = self.routes[key] = RouteMetrics()
+        metrics.observe(status_code, seconds)
+
+    def render(self) -> str:
+        lines: List[str] = [
+            "# HELP http_requests_total Requests by route template and status code.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route), metrics in sorted(self.routes.items()):
+            for status_code, count in sorted(metrics.statuses.items()):
+                lines.append(
+                    f'http_requests_total{{method="{method}",route="{route}",status="{status_code}"}} {count}'
+                )
+
+        lines += [
+            "# HELP http_request_duration_seconds Request latency by route template.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (method, route), metrics in sorted(self.routes.items()):
+            labels = f'method="{method}",route="{route}"'
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, metrics.buckets):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {metrics.count}')
+            lines.append(f"http_request_duration_seconds_sum{{{labels}}} {metrics.latency_sum}")
+            lines.append(f"http_request_duration_seconds_count{{{labels}}} {metrics.count}")
+
+        lines += [
+            "# HELP http_requests_in_flight Requests currently being served.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+        ]
+
+        caches = cache_stats()
+        for name, kind in (("hits", "counter"), ("misses", "counter"), ("evictions", "counter"), ("size", "gauge")):
+            metric = f"cache_{name}" + ("_total" if kind == "counter" else "")
+            lines.append(f"# TYPE {metric} {kind}")
+            for cache, stats in sorted(caches.items()):
+                lines.append(f'{metric}{{cache="{cache}"}} {stats[name]}')
+
+        hasher = password_hasher.stats()
+        lines += [
+            "# TYPE password_hash_waiting gauge",
+            f"password_hash_waiting {hasher['waiting']}",
+            "# TYPE password_hash_in_flight gauge",
+            f"password_hash_in_flight {hasher['in_flight']}",
+            "# TYPE password_hash_completed_total counter",
+            f"password_hash_completed_total {hasher['completed']}",
+            "# TYPE password_hash_wait_seconds_total counter",
+            f"password_hash_wait_seconds_total {hasher['total_wait_seconds']}",
+        ]
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+class MetricsMiddleware:
+    """Records count, status and latency for every HTTP request.
+
+    Requests are labelled with the matched route template (``/products/{product_id}``),
+    which the router stores in the scope; requests that match no route share
+    the ``unmatched`` label so arbitrary paths cannot blow up cardinality.
+    """
+
+    def __init__(self, app, registry: MetricsRegistry = registry):
+        self.app = app
+        self.registry = registry
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        start = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self.registry.in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.registry.in_flight -= 1
+            route = scope.get("route")
+            self.registry.observe(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                status_code,
+                time.perf_counter() - start
+            )
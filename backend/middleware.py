@@ -1,48 +1,227 @@
-from fastapi import Request, HTTPException
-from starlette.middleware.base import BaseHTTPMiddleware
+"""
+Rate limiting and security headers as raw ASGI middleware.
+
+Each client gets a token bucket per policy: O(1) work per request, and idle
+buckets are evicted. Buckets live in a pluggable store so several workers can
+share them.
+"""
+
+import math
 import time
-from collections import defaultdict
-import os
-from typing import Dict, Tuple
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional
 
-# Rate limiting configuration
-RATE_LIMIT_WINDOW = 60  # 1 minute
-MAX_REQUESTS = 60  # 60 requests per minute
+from starlette.responses import JSONResponse
 
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app):
-        super().__init__(app)
-        self.requests: Dict[str, list] = defaultdict(list)
-
-    async def dispatch(self, request: Request, call_next):
-        # Get client IP
-        client_ip = request.client.host
-        
-        # Clean old requests
-        current_time = time.time()
-        self.requests[client_ip] = [
-            req_time for req_time in self.requests[client_ip]
-            if current_time - req_time < RATE_LIMIT_WINDOW
-        ]
-        
-        # Check rate limit
-        if len(self.requests[client_ip]) >= MAX_REQUESTS:
-            raise HTTPException(
+from .auth import token_user_id
+from .config import settings
+from .database import QueryStats, current_query_stats
+
+SECURITY_HEADERS = [
+    (b"x-content-type-options", b"nosniff"),
+    (b"x-frame-options", b"DENY"),
+    (b"x-xss-protection", b"1; mode=block"),
+    (b"strict-transport-security", b"max-age=31536000; includeSubDomains"),
+]
+
+class RateLimitPolicy(NamedTuple):
+    name: str
+    requests_per_minute: int
+    burst: int
+
+    @property
+    def rate(self) -> float:
+        """Tokens refilled per second."""
+        return self.requests_per_minute / 60
+
+class RateLimitRule(NamedTuple):
+    """Policies for paths under ``prefix``, chosen by whether the caller is authenticated."""
+    prefix: str
+    anonymous: RateLimitPolicy
+    authenticated: RateLimitPolicy
+
+    def matches(self, path: str) -> bool:
+        return self.prefix == "/" or path == self.prefix or path.startswith(self.prefix + "/")
+
+def default_rules() -> List[RateLimitRule]:
+    auth = RateLimitPolicy("auth", settings.RATE_LIMIT_AUTH_PER_MINUTE, settings.RATE_LIMIT_AUTH_PER_MINUTE)
+    catalog = RateLimitPolicy("catalog", settings.RATE_LIMIT_CATALOG_PER_MINUTE, settings.RATE_LIMIT_CATALOG_PER_MINUTE)
+    anonymous = RateLimitPolicy("default", settings.RATE_LIMIT_PER_MINUTE, settings.RATE_LIMIT_PER_MINUTE)
+    user = RateLimitPolicy("user", settings.RATE_LIMIT_USER_PER_MINUTE, settings.RATE_LIMIT_USER_PER_MINUTE)
+    return [
+        RateLimitRule("/login", auth, auth),
+        RateLimitRule("/register", auth, auth),
+        RateLimitRule("/products", catalog, catalog),
+        RateLimitRule("/categories", catalog, catalog),
+        RateLimitRule("/", anonymous, user),
+    ]
+
+class RateLimitStore(ABC):
+    """Storage for token buckets."""
+
+    @abstractmethod
+    async def consume(self, key: str, policy: RateLimitPolicy, now: float) -> float:
+        """Take one token from ``key``'s bucket.
+
+        Returns 0 if the request is allowed, otherwise the number of seconds
+        until a token becomes available.
+        """
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Per-process buckets kept in least-recently-used order.
+
+    Buckets untouched for ``idle_seconds`` are dropped from the cold end on each
+    call (amortised O(1)), and at most ``max_keys`` buckets are kept.
+    """
+
+    def __init__(self, max_keys: int, idle_seconds: float):
+        self.max_keys = max_keys
+        self.idle_seconds = idle_seconds
+        self._buckets: "OrderedDict[str, tuple]" = OrderedDict()
+
+    async def consume(self, key: str, policy: RateLimitPolicy, now: float) -> float:
+        tokens, updated = self._buckets.pop(key, (policy.burst, now))
+        tokens = min(policy.burst, tokens + (now - updated) * policy.rate)
+        if tokens >= 1:
+            tokens -= 1
+            retry_after = 0.0
+        else:
+            retry_after = (1 - tokens) / policy.rate
+        self._buckets[key] = (tokens, now)
+        self._evict(now)
+        return retry_after
+
+    def _evict(self, now: float):
+        buckets = self._buckets
+        while buckets:
+            oldest_key = next(iter(buckets))
+            if len(buckets) <= self.max_keys and now - buckets[oldest_key][1] < self.idle_seconds:
+                break
+            del buckets[oldest_key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+class RedisRateLimitStore(RateLimitStore):
+    """Buckets shared by every worker through a Redis-protocol server.
+
+    Any compatible server works, e.g. a local ``redis-server`` during
+    development. Bucket keys expire on their own once the bucket would be full.
+    """
+
+    # KEYS[1] = bucket, ARGV = rate, burst, now
+    SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 't', 'u')
+    local tokens = tonumber(bucket[1]) or burst
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        retry_after = (1 - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 't', tokens, 'u', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+    return tostring(retry_after)
+    """
+
+    def __init__(self, url: str):
+        # Imported lazily: redis is optional and slow to import
+        try:
+            import redis.asyncio as aioredis
+        except ImportError:
+            raise RuntimeError("RATE_LIMIT_STORE=redis requires the 'redis' package")
+        self._redis = aioredis.from_url(url)
+        self._script = self._redis.register_script(self.SCRIPT)
+
+    async def consume(self, key: str, policy: RateLimitPolicy, now: float) -> float:
+        result = await self._script(keys=[f"ratelimit:{key}"], args=[policy.rate, policy.burst, now])
+        return float(result)
+
+def build_rate_limit_store() -> RateLimitStore:
+    if settings.RATE_LIMIT_STORE == "redis":
+        return RedisRateLimitStore(settings.REDIS_URL)
+    return MemoryRateLimitStore(settings.RATE_LIMIT_MAX_KEYS, settings.RATE_LIMIT_IDLE_SECONDS)
+
+class RateLimitMiddleware:
+    def __init__(self, app, store: Optional[RateLimitStore] = None, rules: Optional[List[RateLimitRule]] = None):
+        self.app = app
+        self.store = store or build_rate_limit_store()
+        self.rules = rules or default_rules()
+
+    def _identity(self, scope) -> tuple:
+        """Return (bucket identity, authenticated) for the request."""
+        for name, value in scope["headers"]:
+            if name == b"authorization":
+                scheme, _, token = value.decode("latin-1").partition(" ")
+                if scheme.lower() == "bearer":
+                    user_id = token_user_id(token)
+                    if user_id is not None:
+                        return f"user:{user_id}", True
+                break
+        client = scope.get("client")
+        return f"ip:{client[0] if client else 'unknown'}", False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        identity, authenticated = self._identity(scope)
+        path = scope["path"]
+        rule = next(rule for rule in self.rules if rule.matches(path))
+        policy = rule.authenticated if authenticated else rule.anonymous
+
+        retry_after = await self.store.consume(f"{policy.name}:{identity}", policy, time.time())
+        if retry_after:
+            response = JSONResponse(
                 status_code=429,
-                detail="Too many requests. Please try again later."
+                content={"detail": "Too many requests. Please try again later."},
+                headers={"Retry-After": str(math.ceil(retry_after))}
             )
-        
-        # Add current request
-        self.requests[client_ip].append(current_time)
-        
-        # Add security headers
-        response = await call_next(request)
-        response.headers["X-Content-Type-Options"] = "nosniff"
-        response.headers["X-Frame-Options"] = "DENY"
-        response.headers["X-XSS-Protection"] = "1; mode=block"
-        response.headers["Strict-Transport-Security"] = "max-age=31536000; includeSubDomains"
-        
-        return response
-
-# Create middleware instance
+            response.raw_headers.extend(SECURITY_HEADERS)
+            await response(scope, receive, send)
+            return
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), *SECURITY_HEADERS]
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+class ServerTimingMiddleware:
+    """Collects per-request query stats and reports them in a Server-Timing header."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                timing = (
+                    f'db;dur={stats.total_seconds * 1000:.2f};desc="{stats.count} queries", '
+                    f"db-slowest;dur={stats.slowest_seconds * 1000:.2f}"
+                )
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_query_stats.reset(token)
+
+# Kept for existing imports
 rate_limit_middleware = RateLimitMiddleware
@@ -4,7 +4,7 @@ This module defines the SQLAlchemy models that represent the database tables.
 """
 
 # The ORM 
-from sqlalchemy import Table, Column, Integer, String, MetaData, Float, ForeignKey, DateTime, Enum
+from sqlalchemy import Table, Column, Integer, String, MetaData, Float, ForeignKey, DateTime, Enum, Index
 from datetime import datetime
 
 metadata = MetaData()
@@ -42,6 +42,10 @@ products = Table(
         nullable=False,
         comment="Foreign key to categories table"
     ),
+    # Listing filters and keyset sorts: category pages, price sorts, both combined
+    Index("ix_products_category_id_id", "category_id", "id"),
+    Index("ix_products_price_id", "price", "id"),
+    Index("ix_products_category_id_price_id", "category_id", "price", "id"),
 )
 
 orders = Table(
@@ -75,6 +79,12 @@ orders = Table(
         onupdate=datetime.utcnow,
         comment="Last update timestamp"
     ),
+    # Order history per user, newest first
+    Index("ix_orders_user_id_id", "user_id", "id"),
+    # Admin listing, newest first by (created_at, id), optionally by status or user
+    Index("ix_orders_created_at_id", "created_at", "id"),
+    Index("ix_orders_status_created_at_id", "status", "created_at", "id"),
+    Index("ix_orders_user_id_created_at_id", "user_id", "created_at", "id"),
 )
 
 order_items = Table(
@@ -86,6 +96,7 @@ order_items = Table(
         Integer,
         ForeignKey("orders.id", ondelete="CASCADE"),
         nullable=False,
+        index=True,
         comment="Foreign key to orders table"
     ),
     Column(
@@ -93,8 +104,82 @@ order_items = Table(
         Integer,
         ForeignKey("products.id", ondelete="CASCADE"),
         nullable=False,
+        index=True,
         comment="Foreign key to products table"
     ),
     Column("quantity", Integer, nullable=False, comment="Quantity ordered"),
     Column("price", Float, nullable=False, comment="Price at time of purchase"),
+    Column(
+        "category_id",
+        Integer,
+        comment="Product's category at time of purchase; sales stay attributed to it"
+    ),
+)
+
+# One row per product in a user's cart
+cart_items = Table(
+    "cart_items",
+    metadata,
+    Column(
+        "user_id",
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="Foreign key to users table"
+    ),
+    Column(
+        "product_id",
+        Integer,
+        ForeignKey("products.id", ondelete="CASCADE"),
+        primary_key=True,
+        index=True,
+        comment="Foreign key to products table"
+    ),
+    Column("quantity", Integer, nullable=False, comment="Quantity in cart"),
+    Column("added_at", DateTime, default=datetime.utcnow, comment="When the product was first added"),
+)
+
+# Logged-out tokens, kept until the token expires; see auth.py
+token_revocations = Table(
+    "token_revocations",
+    metadata,
+    Column("token_hash", String, primary_key=True, comment="SHA-256 of the token, hex"),
+    Column("expires_at", DateTime, nullable=False, index=True, comment="The token's exp claim"),
+    Column("revoked_at", DateTime, nullable=False, index=True, comment="When the token was logged out"),
+)
+
+# Stored responses for Idempotency-Key retries; see idempotency.py
+idempotency_keys = Table(
+    "idempotency_keys",
+    metadata,
+    Column(
+        "user_id",
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+        comment="Foreign key to users table"
+    ),
+    Column("key", String, primary_key=True, comment="Client-supplied Idempotency-Key"),
+    Column("fingerprint", String, nullable=False, comment="Hash of the request body"),
+    Column("status_code", Integer, nullable=False, comment="Status of the stored response"),
+    Column("body", String, nullable=False, comment="Stored JSON response body"),
+    Column("created_at", DateTime, default=datetime.utcnow, comment="When the response was stored"),
+    Column("expires_at", DateTime, nullable=False, index=True, comment="When the key may be reused"),
+)
+
+# Sales totals maintained incrementally by order writes; see analytics.py.
+# Keys are ("total", ""), ("day", "YYYY-MM-DD"), ("category", category ID)
+# or ("product", product ID). Total, day and category keys are split over
+# several shard rows that are summed when read; products use shard 0 only.
+sales_rollups = Table(
+    "sales_rollups",
+    metadata,
+    Column("dimension", String, primary_key=True, comment="total, day, category or product"),
+    Column("key", String, primary_key=True, comment="Date, category ID or product ID"),
+    Column("shard", Integer, primary_key=True, default=0, comment="Spreads hot keys over several rows"),
+    Column("revenue", Float, nullable=False, default=0, comment="Revenue of non-cancelled orders"),
+    Column("units", Integer, nullable=False, default=0, comment="Units sold in non-cancelled orders"),
+    Column("orders", Integer, nullable=False, default=0, comment="Non-cancelled orders"),
+    # Top categories/products by revenue
+    Index("ix_sales_rollups_dimension_revenue", "dimension", "revenue"),
 )
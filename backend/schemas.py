@@ -9,7 +9,7 @@ from datetime import datetime # For date and time
 import re # For regular expressions
 
 # This is a list of all the schemas/classes that can be imported from this module
-__all__ = ['UserCreate', 'UserLogin', 'UserOut', 'ProductBase', 'ProductCreate', 'ProductUpdate', 'ProductOut', 'OrderItemBase', 'OrderItemCreate', 'OrderItemOut', 'OrderCreate', 'OrderOut']
+__all__ = ['UserCreate', 'UserLogin', 'UserOut', 'ProductBase', 'ProductCreate', 'ProductUpdate', 'ProductOut', 'ProductPage', 'ProductBatchRequest', 'ProductFilters', 'ProductFacets', 'ProductImportError', 'ProductImportReport', 'OrderItemBase', 'OrderItemCreate', 'OrderItemOut', 'OrderCreate', 'OrderOut', 'OrderPage', 'AdminOrderFilters', 'OrderCount', 'CartItemUpdate', 'CartItemOut', 'CartQuoteLine', 'CartQuote', 'SalesTotals', 'SalesRollupRow', 'SalesAnalytics']
 
 class UserBase(BaseModel):
     """Base user schema with common attributes."""
@@ -82,6 +82,53 @@ class ProductOut(ProductBase):
     id: int
     category: Optional[CategoryOut] = None
 
+class ProductBatchRequest(BaseModel):
+    """Schema for fetching several products by ID in one request."""
+    ids: List[int] = Field(..., min_items=1, max_items=200)
+
+class ProductPage(BaseModel):
+    """Schema for a keyset-paginated page of products."""
+    items: List[ProductOut]
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page, null on the last page")
+
+class ProductFilters(BaseModel):
+    """Query parameters for filtering and sorting the product listing."""
+    category_id: Optional[int] = Field(None, gt=0)
+    min_price: Optional[float] = Field(None, ge=0)
+    max_price: Optional[float] = Field(None, ge=0)
+    in_stock: bool = Field(False, description="Only products with stock left")
+    sort: str = Field("id", pattern="^(id|newest|price_asc|price_desc)$")
+
+class CategoryFacet(BaseModel):
+    """Number of matching products in a category."""
+    category_id: int
+    name: str
+    count: int
+
+class PriceBucketFacet(BaseModel):
+    """Number of matching products in a price range; max_price is exclusive, null for the top bucket."""
+    min_price: float
+    max_price: Optional[float] = None
+    count: int
+
+class ProductFacets(BaseModel):
+    """Facet counts for a filtered product listing."""
+    total: int
+    categories: List[CategoryFacet]
+    price_buckets: List[PriceBucketFacet]
+
+class ProductImportError(BaseModel):
+    """A row rejected by a bulk product import."""
+    line: int = Field(..., description="Line of the upload where the row starts")
+    error: str
+
+class ProductImportReport(BaseModel):
+    """Outcome of a bulk product import."""
+    inserted: int
+    failed: int
+    errors: List[ProductImportError]
+    errors_truncated: bool = Field(False, description="More rows failed than are listed in errors")
+
 # Order item schemas
 class OrderItemBase(BaseModel):
     """Base order item schema with common attributes."""
@@ -111,3 +158,63 @@ class OrderOut(BaseModel):
     created_at: datetime
     updated_at: datetime
     items: List[OrderItemOut]
+
+class OrderPage(BaseModel):
+    """Schema for a keyset-paginated page of orders."""
+    items: List[OrderOut]
+    next_cursor: Optional[str] = Field(None, description="Opaque cursor for the next page, null on the last page")
+
+class AdminOrderFilters(BaseModel):
+    """Query parameters for filtering the admin order listing."""
+    status: Optional[str] = Field(None, pattern="^(pending|completed|cancelled)$")
+    user_id: Optional[int] = Field(None, gt=0)
+    created_from: Optional[datetime] = Field(None, description="Orders created at or after this time")
+    created_to: Optional[datetime] = Field(None, description="Orders created before this time")
+
+class OrderCount(BaseModel):
+    """Number of orders matching a filter."""
+    count: int
+
+# Cart schemas
+class CartItemUpdate(BaseModel):
+    """Schema for setting the quantity of a cart line."""
+    quantity: int = Field(..., gt=0)
+
+class CartItemOut(BaseModel):
+    """Schema for a cart line."""
+    product_id: int
+    quantity: int
+
+class CartQuoteLine(CartItemOut):
+    """A cart line priced against the current catalog."""
+    name: Optional[str] = Field(None, description="Null if the product no longer exists")
+    price: Optional[float] = None
+    stock: int = 0
+    line_total: float = 0.0
+    available: bool
+    reason: Optional[str] = Field(None, description="Why the line cannot be ordered")
+
+class CartQuote(BaseModel):
+    """Priced cart, with lines that cannot be ordered listed in unavailable."""
+    items: List[CartQuoteLine]
+    total: float
+    unavailable: List[int] = Field(..., description="Product IDs of lines that cannot be ordered")
+    can_checkout: bool
+
+# Analytics schemas
+class SalesTotals(BaseModel):
+    """Sales of non-cancelled orders."""
+    revenue: float
+    units: int
+    orders: int
+
+class SalesRollupRow(SalesTotals):
+    """Sales for one day, category or product."""
+    key: str = Field(..., description="Date (YYYY-MM-DD), category ID or product ID")
+    name: Optional[str] = Field(None, description="Category or product name")
+
+class SalesAnalytics(BaseModel):
+    """Sales rollups for one dimension, plus overall totals."""
+    dimension: str
+    totals: SalesTotals
+    rows: List[SalesRollupRow]
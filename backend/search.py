@@ -0,0 +1,96 @@
+"""
+Full-text product search.
+SQLite databases use an FTS5 index kept in sync with ``products`` by triggers;
+Postgres uses a GIN index over a tsvector expression, which it maintains itself.
+"""
+
+import re
+from typing import Optional
+
+from sqlalchemy import column, func, literal_column, table
+
+from .database import IS_SQLITE
+from .models import products
+
+# Postgres: the query must use this same expression for the index to apply
+PG_DOCUMENT = "to_tsvector('english', {table}name || ' ' || coalesce({table}description, ''))"
+
+SQLITE_DDL = [
+    """CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO products_fts(products_fts, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO products_fts(rowid, name, description) VALUES (new.id, new.name, new.description);
+    END""",
+]
+
+products_fts = table("products_fts", column("rowid"))
+
+def ensure_search_index(engine):
+    """Create the search index if missing, backfilling it from existing products."""
+    with engine.begin() as conn:
+        if engine.dialect.name == "sqlite":
+            exists = conn.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+            ).first()
+            if not exists:
+                conn.exec_driver_sql(
+                    "CREATE VIRTUAL TABLE products_fts USING fts5("
+                    "name, description, content='products', content_rowid='id')"
+                )
+                conn.exec_driver_sql("INSERT INTO products_fts(products_fts) VALUES ('rebuild')")
+            for statement in SQLITE_DDL:
+                conn.exec_driver_sql(statement)
+        else:
+            conn.exec_driver_sql(
+                f"CREATE INDEX IF NOT EXISTS ix_products_search ON products USING GIN (({PG_DOCUMENT.format(table='')}))"
+            )
+
+def drop_search_index(engine):
+    if engine.dialect.name == "sqlite":
+        with engine.begin() as conn:
+            conn.exec_driver_sql("DROP TABLE IF EXISTS products_fts")
+
+def _fts5_match(q: str) -> Optional[str]:
+    # Quote every term so user input can't inject FTS5 syntax; the last term
+    # is a prefix match so results show up while the user is still typing.
+    terms = re.findall(r"\w+", q)
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+def apply_search(base_query, q: str):
+    """Restrict a product select to matches for ``q``, ranked best first.
+
+    Returns None when ``q`` contains nothing searchable.
+    """
+    if IS_SQLITE:
+        match = _fts5_match(q)
+        if match is None:
+            return None
+        # bm25 is lower-is-better; name matches weigh ten times description matches
+        rank = func.bm25(literal_column("products_fts"), 10.0, 1.0)
+        return (
+            base_query
+            .join(products_fts, products_fts.c.rowid == products.c.id)
+            .where(literal_column("products_fts").op("MATCH")(match))
+            .order_by(rank, products.c.id)
+        )
+
+    if not q.strip():
+        return None
+    document = literal_column(PG_DOCUMENT.format(table="products."))
+    tsquery = func.websearch_to_tsquery("english", q)
+    return (
+        base_query
+        .where(document.op("@@")(tsquery))
+        .order_by(func.ts_rank_cd(document, tsquery).desc(), products.c.id)
+    )
@@ -1,6 +1,7 @@
 import asyncio
-from database import database
-from models import categories, products
+from sqlalchemy import select
+from .database import database
+from .models import categories, products
 
 async def seed_data():
     await database.connect()
@@ -29,12 +30,13 @@ async def seed_data():
         }
     ]
 
-    # Insert categories and store their IDs
-    category_ids = {}
-    for category in sample_categories:
-        query = categories.insert().values(**category)
-        category_id = await database.execute(query)
-        category_ids[category["name"]] = category_id
+    # Insert all categories in one statement, then read back their IDs
+    await database.execute(categories.insert().values(sample_categories))
+    names = [category["name"] for category in sample_categories]
+    rows = await database.fetch_all(
+        select(categories.c.id, categories.c.name).where(categories.c.name.in_(names))
+    )
+    category_ids = {row["name"]: row["id"] for row in rows}
 
     # Sample products for each category
     sample_products = [
@@ -109,9 +111,7 @@ async def seed_data():
     ]
 
     # Insert products
-    for product in sample_products:
-        query = products.insert().values(**product)
-        await database.execute(query)
+    await database.execute(products.insert().values(sample_products))
 
     await database.disconnect()
     print("Sample data has been added successfully!")
@@ -0,0 +1,53 @@
+"""
+JSON responses for trusted database output.
+
+List endpoints build their response dicts straight from query rows in the
+exact shape of the response schema, so validating them again against the
+response model only burns CPU. Returning ``json_response(...)`` from an
+endpoint bypasses that validation and FastAPI's encoder; the route's
+``response_model`` still documents the shape in OpenAPI.
+
+orjson is used when installed, otherwise the standard library encoder.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Optional
+
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+
+def _default(value: Any):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if orjson is not None:
+    def dumps(content: Any) -> bytes:
+        return orjson.dumps(content, default=_default)
+else:
+    _encoder = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+
+    def dumps(content: Any) -> bytes:
+        return _encoder.encode(content).encode("utf-8")
+
+
+def json_response(content: Any, response: Optional[Response] = None, status_code: int = 200) -> Response:
+    """
+    Encode already-shaped content without response-model validation.
+
+    Pass the endpoint's injected ``response`` to keep headers set by
+    dependencies (e.g. ETags), which FastAPI drops when an endpoint returns
+    its own Response.
+    """
+    headers = response.headers if response is not None else None
+    return Response(dumps(content), status_code=status_code, headers=headers, media_type="application/json")
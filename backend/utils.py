@@ -1,9 +1,87 @@
+import asyncio
+import base64
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
 from passlib.context import CryptContext
+from .config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Hashes with a different cost than BCRYPT_ROUNDS are flagged for rehash on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password) 
\ No newline at end of file
+    return pwd_context.verify(plain_password, hashed_password)
+
+class PasswordHasher:
+    """Runs bcrypt on a dedicated thread pool so it never blocks the event loop.
+
+    At most ``max_concurrency`` hashes run at once; further callers wait on a
+    semaphore, and the wait is recorded in the queueing metrics.
+    """
+
+    def __init__(self, max_concurrency: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="password-hash")
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.max_concurrency = max_concurrency
+        self.waiting = 0
+        self.in_flight = 0
+        self.completed = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    async def _run(self, fn, *args):
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - queued_at
+        self.total_wait_seconds += wait
+        self.max_wait_seconds = max(self.max_wait_seconds, wait)
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.in_flight -= 1
+            self.completed += 1
+            self._slots.release()
+
+    async def hash(self, password: str) -> str:
+        return await self._run(pwd_context.hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Verify a password; also returns a new hash if the stored one uses a stale cost."""
+        return await self._run(pwd_context.verify_and_update, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "waiting": self.waiting,
+            "in_flight": self.in_flight,
+            "completed": self.completed,
+            "total_wait_seconds": self.total_wait_seconds,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+password_hasher = PasswordHasher(settings.PASSWORD_HASH_MAX_CONCURRENCY)
+
+def encode_cursor(values: dict) -> str:
+    """Encode keyset values into an opaque, URL-safe pagination cursor."""
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    """Decode a cursor produced by encode_cursor; raises ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid pagination cursor")
+    if not isinstance(values, dict):
+        raise ValueError("Invalid pagination cursor")
+    return values
@@ -0,0 +1,39 @@
+"""
+Per-request token verification cost with and without the verified-token cache.
+
+Usage: python -m benchmarks.bench_auth [iterations]
+"""
+
+import sys
+import time
+
+from benchmarks import common  # noqa: F401  (sets the benchmark DATABASE_URL)
+from backend.auth import create_access_token, verify_access_token
+from backend.cache import token_cache
+from backend.config import settings
+from jose import jwt
+
+
+def uncached(token):
+    return jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+
+
+def per_call_us(fn, token, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn(token)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    token = create_access_token({"user_id": 1, "email": "bench@example.com"})
+
+    print(f"jose decode + verify     | {per_call_us(uncached, token, iterations):8.2f} us/request")
+    token_cache.clear()
+    print(f"verify_access_token      | {per_call_us(verify_access_token, token, iterations):8.2f} us/request")
+    print(f"token cache              | {token_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
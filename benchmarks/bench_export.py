@@ -0,0 +1,54 @@
+"""
+Table export throughput in rows per second.
+
+Streams every exportable table in both formats through ``export_table`` and
+discards the output; peak traced memory stays at one batch however many
+rows are exported.
+
+Usage: python -m benchmarks.bench_export [orders]
+"""
+
+import asyncio
+import sys
+import time
+import tracemalloc
+
+from benchmarks.common import populate_catalog, populate_orders, reset_database
+from backend.bulk import EXPORT_FORMATS, EXPORT_TABLES, export_table
+from backend.database import database
+
+
+async def drain(table: str, fmt: str):
+    rows = size = 0
+    async for chunk in export_table(table, fmt):
+        size += len(chunk)
+        rows += chunk.count(b"\n")
+    if fmt == "csv":
+        rows -= 1  # header
+    return rows, size
+
+
+async def main():
+    n_orders = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    reset_database()
+    populate_catalog(n_orders)
+    populate_orders(n_orders)
+    await database.connect()
+    try:
+        for table in EXPORT_TABLES:
+            for fmt in EXPORT_FORMATS:
+                start = time.perf_counter()
+                rows, size = await drain(table, fmt)
+                elapsed = time.perf_counter() - start
+                tracemalloc.start()
+                await drain(table, fmt)
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f"{table:<12} {fmt:<6} | {rows:>9} rows | {rows / elapsed:10.0f} rows/s | "
+                      f"{size / elapsed / 2**20:7.1f} MiB/s | peak {peak / 2**20:6.1f} MiB")
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
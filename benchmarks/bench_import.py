@@ -0,0 +1,59 @@
+"""
+Bulk product import throughput for a generated CSV feed.
+
+The feed is produced in 64 KiB chunks, as an upload would arrive, and fed to
+``import_products``; compare the peak RSS with the size of the feed.
+
+Usage: python -m benchmarks.bench_import [rows]
+"""
+
+import asyncio
+import resource
+import sys
+import time
+
+from benchmarks.common import populate_catalog, reset_database
+from backend.bulk import import_products
+from backend.database import database
+
+CHUNK_BYTES = 64 * 1024
+
+
+async def csv_feed(rows: int, sizes: list):
+    buffer = ["name,description,price,stock,image_url,category\n"]
+    length = 0
+    for i in range(1, rows + 1):
+        line = (f'"Supplier item {i}","Imported description for item {i}, with a comma",'
+                f"{i % 500 + 0.99},{i % 100},https://img.example/s/{i}.jpg,Category {i % 20 + 1}\n")
+        buffer.append(line)
+        length += len(line)
+        if length >= CHUNK_BYTES:
+            chunk = "".join(buffer).encode()
+            sizes[0] += len(chunk)
+            yield chunk
+            buffer, length = [], 0
+    chunk = "".join(buffer).encode()
+    sizes[0] += len(chunk)
+    yield chunk
+
+
+async def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    reset_database()
+    populate_catalog(0)
+    await database.connect()
+    try:
+        sizes = [0]
+        start = time.perf_counter()
+        report = await import_products(csv_feed(rows, sizes), "csv")
+        elapsed = time.perf_counter() - start
+    finally:
+        await database.disconnect()
+    peak_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"{rows} rows | {elapsed:7.2f} s | {report['inserted'] / elapsed:9.0f} rows/s | "
+          f"inserted {report['inserted']} failed {report['failed']} | "
+          f"feed {sizes[0] / 2**20:6.1f} MiB | peak RSS {peak_mib:6.1f} MiB")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
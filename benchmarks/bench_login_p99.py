@@ -0,0 +1,87 @@
+"""
+Catalog latency while logins run concurrently.
+
+Compares catalog p99 with no login traffic, with bcrypt verification run
+inline on the event loop (the old /login behaviour) and with verification
+offloaded to the password hashing pool.
+
+Usage: python -m benchmarks.bench_login_p99 [concurrent_logins]
+"""
+
+import asyncio
+import sys
+import time
+
+from benchmarks.common import populate_catalog, reset_database
+from backend.crud import create_user, get_all_products
+from backend.cache import product_list_cache
+from backend.database import database
+from backend.schemas import UserCreate
+from backend.utils import password_hasher, verify_password
+
+EMAIL = "bench@example.com"
+PASSWORD = "benchpass1"
+
+
+async def catalog_latencies(duration: float):
+    samples = []
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        product_list_cache.clear()
+        start = time.perf_counter()
+        await get_all_products(50, None)
+        samples.append((time.perf_counter() - start) * 1000)
+        await asyncio.sleep(0.005)
+    samples.sort()
+    return samples[len(samples) // 2], samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+
+
+async def login_inline(hashed):
+    verify_password(PASSWORD, hashed)
+    await asyncio.sleep(0)
+
+
+async def login_offloaded(hashed):
+    await password_hasher.verify_and_update(PASSWORD, hashed)
+
+
+async def login_storm(login, hashed, concurrency: int, stop: asyncio.Event):
+    async def worker():
+        while not stop.is_set():
+            await login(hashed)
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def scenario(name, login, hashed, concurrency, duration=5.0):
+    stop = asyncio.Event()
+    storm = None
+    if login is not None:
+        storm = asyncio.create_task(login_storm(login, hashed, concurrency, stop))
+    p50, p99 = await catalog_latencies(duration)
+    stop.set()
+    if storm is not None:
+        await storm
+    print(f"{name:<22} | catalog p50 {p50:8.2f} ms | p99 {p99:8.2f} ms")
+
+
+async def main():
+    concurrency = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    reset_database()
+    populate_catalog(10_000)
+    await database.connect()
+    try:
+        user = await create_user(UserCreate(name="Bench", email=EMAIL, password=PASSWORD))
+        hashed = (await database.fetch_one(
+            "SELECT hashed_password FROM users WHERE id = :id", {"id": user["id"]}
+        ))["hashed_password"]
+
+        await scenario("no logins", None, hashed, concurrency)
+        await scenario("inline bcrypt", login_inline, hashed, concurrency)
+        await scenario("offloaded bcrypt", login_offloaded, hashed, concurrency)
+        print(f"hash pool: {password_hasher.stats()}")
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Full catalog scan vs keyset-paginated reads of GET /products.
+
+Usage: python -m benchmarks.bench_pagination [10000,100000,1000000]
+"""
+
+import asyncio
+import sys
+import tracemalloc
+
+from benchmarks.common import measure, parse_sizes, populate_catalog, reset_database
+from backend.cache import product_cache, product_list_cache
+from backend.crud import _product_query, _product_row, get_all_products
+from backend.database import database
+from backend.utils import encode_cursor
+
+
+async def full_scan():
+    # What GET /products did before pagination: every row, every request.
+    results = await database.fetch_all(_product_query())
+    return [_product_row(result) for result in results]
+
+
+def uncached(fn):
+    # Every call reads the database rather than the catalog caches
+    async def call():
+        product_list_cache.clear()
+        product_cache.clear()
+        return await fn()
+    return call
+
+
+async def peak_memory_kb(fn):
+    tracemalloc.start()
+    await fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+async def run(size: int):
+    reset_database()
+    populate_catalog(size)
+    await database.connect()
+    try:
+        # Cursor pointing at the last page, to show deep pages cost the same.
+        deep_cursor = encode_cursor({"id": max(size - 50, 0)})
+
+        cases = {
+            "full scan": full_scan,
+            "first page (50)": uncached(lambda: get_all_products(50, None)),
+            "last page (50)": uncached(lambda: get_all_products(50, deep_cursor)),
+        }
+        for name, fn in cases.items():
+            repeat = 3 if name == "full scan" else 50
+            stats = await measure(fn, repeat)
+            peak = await peak_memory_kb(fn)
+            print(f"{size:>9} | {name:<16} | mean {stats['mean']:9.2f} ms | "
+                  f"p99 {stats['p99']:9.2f} ms | peak {peak:11.0f} KiB")
+    finally:
+        await database.disconnect()
+
+
+async def main():
+    for size in parse_sizes(sys.argv, [10_000, 100_000, 1_000_000]):
+        await run(size)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+Response building cost of GET /products and GET /orders.
+
+Compares, per 200-row page, the old path (keyed row mapping, response-model
+validation, FastAPI's JSON encoding) with the fast path (positional row
+mapping, direct encoding), then measures end-to-end throughput of both
+endpoints through the application. The old path is served end to end from
+equivalent routes registered by this script. Catalog caches are cleared
+before every request, so each one reads and encodes a full page.
+
+Usage: python -m benchmarks.bench_serialization [pages]
+"""
+
+import asyncio
+import os
+import sys
+import time
+from typing import List
+
+import httpx
+from fastapi import Depends
+from pydantic import TypeAdapter
+
+# Keep rate limiting out of the way; must be set before the settings load
+for name in ("RATE_LIMIT_PER_MINUTE", "RATE_LIMIT_USER_PER_MINUTE", "RATE_LIMIT_CATALOG_PER_MINUTE"):
+    os.environ[name] = "1000000"
+
+from benchmarks.common import populate_catalog, populate_orders, reset_database
+from backend.auth import create_access_token, get_current_user
+from backend.cache import product_cache, product_list_cache
+from backend.crud import _product_query, _product_row, get_user_orders
+from backend.database import database
+from backend.main import app
+from backend.models import order_items, orders, products
+from backend.schemas import OrderOut, ProductPage
+from backend.serialization import dumps
+from backend.utils import encode_cursor
+
+PAGE = 200
+
+
+def legacy_product_row(result):
+    return {
+        **dict(result),
+        'category': {
+            'id': result['category_id'],
+            'name': result['category_name'],
+            'description': result['category_description'],
+            'image_url': result['category_image_url']
+        }
+    }
+
+
+async def legacy_products(limit: int = PAGE):
+    # GET /products before: keyed row mapping, validated against response_model
+    rows = await database.fetch_all(_product_query().order_by(products.c.id).limit(limit + 1))
+    next_cursor = encode_cursor({"id": rows[limit - 1]["id"]}) if len(rows) > limit else None
+    return {"items": [legacy_product_row(row) for row in rows[:limit]], "next_cursor": next_cursor}
+
+
+async def legacy_orders(limit: int = PAGE, current_user: dict = Depends(get_current_user)):
+    # GET /orders before: keyed mapping of orders and items, validated against response_model
+    order_rows = await database.fetch_all(
+        orders.select().where(orders.c.user_id == current_user["id"]).order_by(orders.c.id.desc()).limit(limit)
+    )
+    orders_by_id = {order["id"]: {**dict(order), "items": []} for order in order_rows}
+    items = await database.fetch_all(
+        order_items.select().where(order_items.c.order_id.in_(list(orders_by_id))).order_by(order_items.c.id)
+    )
+    for item in items:
+        orders_by_id[item["order_id"]]["items"].append(dict(item))
+    return list(orders_by_id.values())
+
+
+app.add_api_route("/legacy/products", legacy_products, response_model=ProductPage)
+app.add_api_route("/legacy/orders", legacy_orders, response_model=List[OrderOut])
+
+
+def validated_json(adapter):
+    # What FastAPI does with a plain return value and a response_model
+    return lambda content: adapter.dump_json(adapter.validate_python(content))
+
+
+def per_page_ms(fn, pages):
+    start = time.perf_counter()
+    for _ in range(pages):
+        fn()
+    return (time.perf_counter() - start) / pages * 1000
+
+
+async def requests_per_second(client, url, headers, pages):
+    start = time.perf_counter()
+    for _ in range(pages):
+        product_list_cache.clear()
+        product_cache.clear()
+        response = await client.get(url, headers=headers)
+        response.raise_for_status()
+    return pages / (time.perf_counter() - start)
+
+
+async def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    reset_database()
+    populate_catalog(10_000)
+    populate_orders(2_000, n_users=5)
+    await database.connect()
+    try:
+        product_rows = await database.fetch_all(_product_query().limit(PAGE))
+        order_page = await get_user_orders(1, PAGE)
+
+        product_json = validated_json(TypeAdapter(ProductPage))
+        order_json = validated_json(TypeAdapter(List[OrderOut]))
+        cases = {
+            "products: map rows (old)": lambda: [legacy_product_row(row) for row in product_rows],
+            "products: map rows (new)": lambda: [_product_row(row) for row in product_rows],
+            "products: map+encode (old)": lambda: product_json(
+                {"items": [legacy_product_row(row) for row in product_rows], "next_cursor": None}),
+            "products: map+encode (new)": lambda: dumps(
+                {"items": [_product_row(row) for row in product_rows], "next_cursor": None}),
+            "orders: encode (old)": lambda: order_json(order_page),
+            "orders: encode (new)": lambda: dumps(order_page),
+        }
+        for name, fn in cases.items():
+            print(f"{name:<28} | {per_page_ms(fn, pages):8.3f} ms/page")
+
+        token = create_access_token({"user_id": 1, "email": "user1@example.com"})
+        auth = {"Authorization": f"Bearer {token}"}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for path, headers in (("/products", None), ("/orders", auth)):
+                for label, prefix in (("old", "/legacy"), ("new", "")):
+                    rps = await requests_per_second(client, f"{prefix}{path}?limit={PAGE}", headers, pages)
+                    name = f"GET {path}?limit={PAGE} ({label})"
+                    print(f"{name:<34} | {rps:8.1f} requests/s")
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
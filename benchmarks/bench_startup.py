@@ -0,0 +1,73 @@
+"""
+Application cold start: import time of backend.main and time to first request.
+
+Time to first request launches a fresh uvicorn worker and polls
+GET /categories until it answers 200.
+
+Usage: python -m benchmarks.bench_startup [runs]
+"""
+
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from benchmarks.common import populate_catalog, reset_database
+
+IMPORT_SNIPPET = (
+    "import time; start = time.perf_counter(); import backend.main; "
+    "print(time.perf_counter() - start)"
+)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def import_seconds():
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET], check=True, capture_output=True, text=True, env=os.environ
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def first_request_seconds(timeout: float = 30.0):
+    port = free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "backend.main:app", "--port", str(port), "--log-level", "warning"],
+        env=os.environ
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/categories", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                time.sleep(0.01)
+        raise RuntimeError("server did not answer in time")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    reset_database()
+    populate_catalog(1_000)
+
+    imports = [import_seconds() for _ in range(runs)]
+    print(f"import backend.main  | median {statistics.median(imports) * 1000:8.1f} ms | max {max(imports) * 1000:8.1f} ms")
+    firsts = [first_request_seconds() for _ in range(runs)]
+    print(f"time to first request | median {statistics.median(firsts) * 1000:8.1f} ms | max {max(firsts) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Regression check for the streaming CSV and NDJSON parsers used by the bulk
+importer.
+
+Feeds uploads through ``_csv_rows`` and ``_ndjson_rows`` whole and in
+awkward chunk sizes (down to one byte, so UTF-8 sequences and records are
+split mid-way). CSV records are compared with what the csv module reads
+from the same text. Line endings inside quoted fields come through as
+"\n", as ``_lines`` splits on "\n" and strips a trailing "\r". Finally,
+newline-free uploads of growing size are parsed under tracemalloc: peak
+memory must stay bounded and time must grow linearly. Exits non-zero on
+any failure.
+
+Usage: python -m benchmarks.check_import_parser
+"""
+
+import asyncio
+import csv
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+from backend.bulk import TOO_LONG, _csv_rows, _ndjson_rows
+from backend.config import settings
+
+HEADER = "name,description,price,stock,category\n"
+LONG = "x" * (settings.IMPORT_MAX_RECORD_CHARS + 10)
+HALF = "x" * (settings.IMPORT_MAX_RECORD_CHARS // 2 + 10)
+MUG = "Mug,Ceramic,8,30,Kitchen\n"
+
+# name -> (upload, expected (line, name or error message) per record)
+CASES = {
+    "unquoted inner quotes": (
+        HEADER
+        + 'TV 55" 4K,Big screen,499,3,Electronics\n'
+        + 'Cable,6" long,5,10,Electronics\n'
+        + "Lamp,Desk lamp,20,4,Home\n",
+        [(2, 'TV 55" 4K'), (3, "Cable"), (4, "Lamp")],
+    ),
+    "multi-line quoted fields": (
+        HEADER
+        + '"Sofa","Three seats,\nwith ""soft"" cushions\n\nand legs",899,2,Home\n'
+        + 'Crème brûlée torch,"Line one\r\nline two",25,7,Kitchen\n'
+        + "Chair,Oak,120,5,Home",
+        [(2, "Sofa"), (6, "Crème brûlée torch"), (8, "Chair")],
+    ),
+    "quote after field start is literal": (
+        HEADER + 'Rope,"10 m" coil,15,4,Outdoor\nTent,2 "person",150,1,Outdoor\n',
+        [(2, "Rope"), (3, "Tent")],
+    ),
+    "oversized multi-line record is skipped": (
+        HEADER + f'Blob,"{HALF}\n{HALF}",1,1,Home\n' + MUG,
+        [(2, TOO_LONG), (4, "Mug")],
+    ),
+    # The quoting of a skipped line is unknown, so it ends its record and the
+    # record's next line is read as a record of its own
+    "over-long line ends its record": (
+        HEADER + f'Blob,"{LONG}\n{LONG}",1,1,Home\n' + MUG,
+        [(2, TOO_LONG), (3, TOO_LONG), (4, "Mug")],
+    ),
+    "carriage-return-only rows": (
+        HEADER + "Lamp,Desk lamp,20,4,Home\rCable,Long,5,10,Home\n" + MUG,
+        [(2, "Invalid CSV"), (3, "Mug")],
+    ),
+    "carriage-return-only rows over the limit": (
+        HEADER + "\r".join([f"Lamp {i},Desk lamp,20,4,Home" for i in range(4000)]) + "\n" + MUG,
+        [(2, TOO_LONG), (3, "Mug")],
+    ),
+    "unterminated quoted field": (
+        HEADER + "Mug,Ceramic,8,30,Kitchen\n" + 'Vase,"Glass,12,3,Home\n',
+        [(2, "Mug"), (3, "Unterminated quoted field")],
+    ),
+}
+
+
+# name -> (upload, expected (line, name or error message) per line)
+NDJSON_CASES = {
+    "objects and errors": (
+        json.dumps({"name": "Lamp"}) + "\n\n[1]\n{oops\n" + json.dumps({"name": "Mug"}),
+        [(1, "Lamp"), (3, "Expected a JSON object"), (4, "Invalid JSON"), (5, "Mug")],
+    ),
+    "over-long line is skipped": (
+        json.dumps({"name": "Blob", "description": LONG}) + "\n" + json.dumps({"name": "Mug"}) + "\n",
+        [(1, TOO_LONG), (2, "Mug")],
+    ),
+}
+
+# Sizes of the newline-free uploads, in MiB
+FLAT_SIZES = (4, 8, 16)
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def parse(parser, upload: str, size: int):
+    rows = []
+    async for line_no, row in parser(chunked(upload.encode(), size)):
+        rows.append((line_no, row))
+    return rows
+
+
+def summary(rows):
+    """(line, product name or error message up to its first colon) per row."""
+    return [(line_no, row.split(":")[0] if isinstance(row, str) else row["name"]) for line_no, row in rows]
+
+
+async def flat_upload(mib: int):
+    """A CSV header, then ``mib`` MiB without a single newline, in 64 KiB chunks."""
+    yield HEADER.encode()
+    chunk = b"Lamp,Desk lamp,20,4,Home\r" * (64 * 1024 // 25)
+    for _ in range(mib * 1024 * 1024 // len(chunk)):
+        yield chunk
+
+
+async def check_flat_uploads():
+    """Peak memory and time for newline-free uploads; returns the number of failures."""
+    failures = 0
+    timings = []
+    for mib in FLAT_SIZES:
+        for parser in (_csv_rows, _ndjson_rows):
+            tracemalloc.start()
+            start = time.perf_counter()
+            rows = [row async for row in parser(flat_upload(mib))]
+            elapsed = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if parser is _csv_rows:
+                timings.append(elapsed)
+            expected = [(2, TOO_LONG)] if parser is _csv_rows else [(1, "Invalid JSON"), (2, TOO_LONG)]
+            ok = summary(rows) == expected and peak < 2 * 1024 * 1024
+            print(f"{'ok  ' if ok else 'FAIL'} {parser.__name__:<12} {mib:>3} MiB without newlines | "
+                  f"{elapsed:6.2f} s | peak {peak / 1024:8.0f} KiB")
+            failures += not ok
+    # Linear: each doubling of the upload should at most roughly double the time
+    for smaller, larger in zip(timings, timings[1:]):
+        if larger > 3 * smaller + 0.05:
+            failures += 1
+            print(f"FAIL parse time grew from {smaller:.2f} s to {larger:.2f} s when the upload doubled")
+    return failures
+
+
+def expected_fields(upload: str):
+    """Descriptions the csv module reads from the upload, keyed by product name."""
+    csv.field_size_limit(4 * len(LONG))
+    rows = csv.DictReader(io.StringIO(upload, newline=""))
+    return {row["name"]: row["description"].replace("\r\n", "\n") for row in rows}
+
+
+async def run():
+    failures = 0
+    for name, (upload, expected) in CASES.items():
+        reference = expected_fields(upload)
+        for size in (1, 7, 64 * 1024):
+            rows = await parse(_csv_rows, upload, size)
+            got = summary(rows)
+            ok = got == expected
+            for _, row in rows:
+                if isinstance(row, dict) and row["name"] in reference:
+                    ok &= row["description"] == reference[row["name"]]
+            if not ok:
+                failures += 1
+                print(f"FAIL {name} (chunks of {size} bytes): {got!r:.300}")
+    for name, (upload, expected) in NDJSON_CASES.items():
+        for size in (1, 7, 64 * 1024):
+            got = summary(await parse(_ndjson_rows, upload, size))
+            if got != expected:
+                failures += 1
+                print(f"FAIL NDJSON {name} (chunks of {size} bytes): {got!r:.300}")
+    failures += await check_flat_uploads()
+    print(f"{len(CASES) + len(NDJSON_CASES)} uploads and {len(FLAT_SIZES)} newline-free sizes checked, "
+          f"{failures} failures")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(run()) else 0)
@@ -0,0 +1,187 @@
+"""
+Query-plan regression check for every query in backend/crud.py and the
+analytics reads.
+
+Runs each crud function against a populated SQLite database, captures the
+statements it issues and runs EXPLAIN QUERY PLAN on them. Exits non-zero if
+any statement scans a large table (products, orders, order_items,
+cart_items, sales_rollups) outside
+the scans listed in ALLOWED_SCANS.
+
+Usage: python -m benchmarks.check_query_plans
+"""
+
+import asyncio
+import re
+import sqlite3
+import sys
+from datetime import date, datetime
+
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.sql import ClauseElement
+
+from benchmarks.common import DB_PATH, populate_catalog, populate_orders, reset_database
+from backend import crud
+from backend.analytics import get_analytics
+from backend.cache import invalidate_categories, principal_cache
+from backend.database import database
+from backend.utils import encode_cursor
+from backend.schemas import (
+    AdminOrderFilters, CategoryUpdate, OrderCreate, OrderItemCreate, ProductCreate, ProductFilters, ProductUpdate
+)
+
+LARGE_TABLES = {"products", "orders", "order_items", "cart_items", "sales_rollups"}
+
+# (scenario, table) -> why a full scan is expected there
+ALLOWED_SCANS = {
+    ("get_all_products", "products"): "walks the primary key and stops after LIMIT rows",
+    ("get_all_products newest", "products"): "walks the primary key backwards and stops after LIMIT rows",
+    ("get_all_products in_stock", "products"): "walks the primary key, filters stock, stops after LIMIT rows",
+    ("get_product_facets", "products"): "unfiltered facets aggregate the whole catalog by definition",
+}
+
+SCAN = re.compile(r"^SCAN (\w+)(?! USING (?:COVERING )?INDEX)")
+
+
+class RecordingDatabase:
+    """Delegates to the real database, remembering each statement and the scenario that issued it."""
+
+    def __init__(self, inner):
+        self._inner = inner
+        self.scenario = None
+        self.statements = []
+
+    def __getattr__(self, name):
+        return getattr(self._inner, name)
+
+    def _remember(self, query):
+        if isinstance(query, ClauseElement):
+            self.statements.append((self.scenario, query))
+
+    async def execute(self, query, values=None):
+        self._remember(query)
+        return await self._inner.execute(query, values)
+
+    async def execute_many(self, query, values):
+        self._remember(query)
+        return await self._inner.execute_many(query, values)
+
+    async def fetch_all(self, query, values=None):
+        self._remember(query)
+        return await self._inner.fetch_all(query, values)
+
+    async def fetch_one(self, query, values=None):
+        self._remember(query)
+        return await self._inner.fetch_one(query, values)
+
+    async def fetch_val(self, query, values=None, column=0):
+        self._remember(query)
+        return await self._inner.fetch_val(query, values, column)
+
+    def iterate(self, query, values=None):
+        self._remember(query)
+        return self._inner.iterate(query, values)
+
+
+def scenarios():
+    page = ProductFilters()
+    january = {"created_from": datetime(2024, 1, 2), "created_to": datetime(2024, 1, 9)}
+    return [
+        ("get_user_by_email", lambda: crud.get_user_by_email("user1@example.com")),
+        ("get_category", lambda: crud.get_category(1)),
+        ("get_all_categories", crud.get_all_categories),
+        ("get_product", lambda: crud.get_product(42)),
+        ("get_products_by_ids", lambda: crud.get_products_by_ids([1, 2, 3])),
+        ("get_all_products", lambda: crud.get_all_products(50, None, page)),
+        ("get_all_products after", lambda: crud.get_all_products(50, "eyJpZCI6MTAwfQ", page)),
+        ("get_all_products newest", lambda: crud.get_all_products(50, None, ProductFilters(sort="newest"))),
+        ("get_all_products category", lambda: crud.get_all_products(50, None, ProductFilters(category_id=3))),
+        ("get_all_products price", lambda: crud.get_all_products(50, None, ProductFilters(sort="price_asc"))),
+        ("get_all_products price range", lambda: crud.get_all_products(
+            50, None, ProductFilters(min_price=10, max_price=20, sort="price_desc"))),
+        ("get_all_products category price", lambda: crud.get_all_products(
+            50, None, ProductFilters(category_id=3, sort="price_asc"))),
+        ("get_all_products in_stock", lambda: crud.get_all_products(50, None, ProductFilters(in_stock=True))),
+        ("get_products_by_category", lambda: crud.get_products_by_category(3)),
+        ("search_products", lambda: crud.search_products("product 42")),
+        ("get_product_facets", lambda: crud.get_product_facets(page)),
+        ("get_product_facets category", lambda: crud.get_product_facets(ProductFilters(category_id=3))),
+        ("get_order", lambda: crud.get_order(7)),
+        ("get_user_orders", lambda: crud.get_user_orders(5)),
+        ("get_user_orders before", lambda: crud.get_user_orders(5, 50, 1000)),
+        ("get_admin_orders", lambda: crud.get_admin_orders(50)),
+        ("get_admin_orders after", lambda: crud.get_admin_orders(50, encode_cursor(
+            {"created_at": "2024-01-05T00:00:00", "id": 5000}))),
+        ("get_admin_orders status", lambda: crud.get_admin_orders(50, None, AdminOrderFilters(status="pending"))),
+        ("get_admin_orders status range", lambda: crud.get_admin_orders(
+            50, None, AdminOrderFilters(status="cancelled", **january))),
+        ("get_admin_orders user", lambda: crud.get_admin_orders(50, None, AdminOrderFilters(user_id=5))),
+        ("count_admin_orders status range", lambda: crud.count_admin_orders(
+            AdminOrderFilters(status="completed", **january))),
+        ("count_admin_orders user", lambda: crud.count_admin_orders(AdminOrderFilters(user_id=5))),
+        ("create_order", lambda: crud.create_order(
+            5, OrderCreate(items=[OrderItemCreate(product_id=10, quantity=1)]))),
+        ("set_cart_item", lambda: crud.set_cart_item(5, 10, 2)),
+        ("get_cart", lambda: crud.get_cart(5)),
+        ("get_cart_quote", lambda: crud.get_cart_quote(5)),
+        ("remove_cart_item", lambda: crud.remove_cart_item(5, 11)),
+        ("checkout_cart", lambda: crud.checkout_cart(5)),
+        ("update_order_status", lambda: crud.update_order_status(7, "completed")),
+        ("update_user", lambda: crud.update_user(5, name="Renamed")),
+        ("create_product", lambda: crud.create_product(ProductCreate(
+            name="New product", price=10, stock=5, category_id=2))),
+        ("update_product", lambda: crud.update_product(11, ProductUpdate(
+            name="Updated product", price=11, stock=5, category_id=2))),
+        ("delete_product", lambda: crud.delete_product(12)),
+        ("get_analytics day", lambda: get_analytics("day", 30, date(2024, 1, 2), date(2024, 1, 9))),
+        ("get_analytics category", lambda: get_analytics("category", 30)),
+        ("get_analytics product", lambda: get_analytics("product", 30)),
+        ("update_category", lambda: crud.update_category(2, CategoryUpdate(name="Renamed category"))),
+    ]
+
+
+def explain(conn, query):
+    compiled = query.compile(dialect=sqlite.dialect(), compile_kwargs={"render_postcompile": True})
+    params = [compiled.params[name] for name in compiled.positiontup or ()]
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+    return [row[3] for row in rows]
+
+
+async def run():
+    reset_database()
+    populate_catalog(20_000)
+    populate_orders(20_000, n_users=500)
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute("ANALYZE")
+    conn.commit()
+
+    recorder = RecordingDatabase(database._database)
+    database._database = recorder
+    await database.connect()
+    try:
+        for name, call in scenarios():
+            invalidate_categories()
+            principal_cache.clear()
+            recorder.scenario = name
+            await call()
+    finally:
+        await database.disconnect()
+
+    failures = 0
+    for scenario, query in recorder.statements:
+        for detail in explain(conn, query):
+            match = SCAN.match(detail)
+            if not match or match.group(1) not in LARGE_TABLES:
+                continue
+            if (scenario, match.group(1)) in ALLOWED_SCANS:
+                continue
+            failures += 1
+            print(f"FAIL {scenario}: {detail}\n     {query}\n")
+    conn.close()
+
+    print(f"{len(recorder.statements)} statements checked, {failures} unexpected scans")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(run()) else 0)
@@ -0,0 +1,122 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a throwaway SQLite database so they need no running
+Postgres. Import this module before anything from ``backend`` so that the
+application settings pick up the benchmark DATABASE_URL.
+
+Run a benchmark from the repository root, e.g.::
+
+    python -m benchmarks.bench_pagination
+"""
+
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "ecommerce_bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from sqlalchemy import create_engine  # noqa: E402
+from backend.models import metadata  # noqa: E402
+from backend.search import ensure_search_index  # noqa: E402
+
+
+def reset_database():
+    """Drop and recreate the benchmark schema."""
+    if os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+    engine = create_engine(os.environ["DATABASE_URL"])
+    metadata.create_all(engine)
+    ensure_search_index(engine)
+    engine.dispose()
+
+
+def populate_catalog(n_products: int, n_categories: int = 20, seed: int = 42):
+    """Bulk-load categories and products straight through sqlite3."""
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(DB_PATH)
+    conn.executemany(
+        "INSERT INTO categories (id, name, description, image_url) VALUES (?, ?, ?, ?)",
+        [(i, f"Category {i}", f"Description of category {i}", f"https://img.example/c/{i}.jpg")
+         for i in range(1, n_categories + 1)]
+    )
+    batch = []
+    for i in range(1, n_products + 1):
+        batch.append((
+            i,
+            f"Product {i}",
+            f"Long marketing description for product number {i} " * 3,
+            round(rnd.uniform(1, 500), 2),
+            rnd.randint(0, 100),
+            f"https://img.example/p/{i}.jpg",
+            rnd.randint(1, n_categories),
+        ))
+        if len(batch) == 50_000:
+            conn.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+            batch.clear()
+    if batch:
+        conn.executemany("INSERT INTO products VALUES (?, ?, ?, ?, ?, ?, ?)", batch)
+    conn.commit()
+    conn.close()
+
+
+def populate_orders(n_orders: int, n_users: int = 100, items_per_order: int = 3, seed: int = 42):
+    """Bulk-load users, orders and order items; expects populate_catalog to have run."""
+    rnd = random.Random(seed)
+    conn = sqlite3.connect(DB_PATH)
+    n_products = conn.execute("SELECT count(*) FROM products").fetchone()[0]
+    conn.executemany(
+        "INSERT INTO users (id, name, email, hashed_password, is_admin) VALUES (?, ?, ?, ?, 0)",
+        [(i, f"User {i}", f"user{i}@example.com", "x") for i in range(1, n_users + 1)]
+    )
+    start = datetime(2024, 1, 1)
+    orders, items = [], []
+    item_id = 0
+    for order_id in range(1, n_orders + 1):
+        created_at = str(start + timedelta(minutes=order_id))
+        total = 0.0
+        for _ in range(items_per_order):
+            item_id += 1
+            quantity = rnd.randint(1, 3)
+            price = round(rnd.uniform(1, 500), 2)
+            total += quantity * price
+            items.append((item_id, order_id, rnd.randint(1, n_products), quantity, price))
+        status = rnd.choice(("pending", "completed", "completed", "cancelled"))
+        orders.append((order_id, rnd.randint(1, n_users), status, round(total, 2), created_at, created_at))
+        if len(orders) == 20_000:
+            conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?)", orders)
+            conn.executemany("INSERT INTO order_items (id, order_id, product_id, quantity, price) VALUES (?, ?, ?, ?, ?)", items)
+            orders.clear()
+            items.clear()
+    if orders:
+        conn.executemany("INSERT INTO orders VALUES (?, ?, ?, ?, ?, ?)", orders)
+        conn.executemany("INSERT INTO order_items (id, order_id, product_id, quantity, price) VALUES (?, ?, ?, ?, ?)", items)
+    conn.commit()
+    conn.close()
+
+
+async def measure(fn, repeat: int = 20):
+    """Await ``fn()`` ``repeat`` times and return latency stats in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "mean": statistics.mean(samples),
+        "p50": samples[len(samples) // 2],
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+def parse_sizes(argv, default):
+    """Parse a comma-separated list of sizes from the command line."""
+    if len(argv) > 1:
+        return [int(x) for x in argv[1].split(",")]
+    return default
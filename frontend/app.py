@@ -8,6 +8,14 @@ from datetime import datetime
 load_dotenv()
 
 API_URL = os.getenv("API_URL", "http://localhost:8000")
+ORDERS_PAGE_SIZE = 20
+CATALOG_CACHE_SIZE = 200
+SORT_OPTIONS = {
+    "id": "Default",
+    "newest": "Newest",
+    "price_asc": "Price: low to high",
+    "price_desc": "Price: high to low",
+}
 
 def validate_email(email):
     pattern = r'^[\w\.-]+@[\w\.-]+\.\w+$'
@@ -21,15 +29,52 @@ def get_auth_header():
         return {"Authorization": f"Bearer {st.session_state.token}"}
     return None
 
+def fetch_products(product_ids):
+    """Fetch products by ID via the batch endpoint, keyed by product ID."""
+    ids = list(dict.fromkeys(product_ids))
+    products = {}
+    for start in range(0, len(ids), 200):
+        res = requests.post(f"{API_URL}/products/batch", json={"ids": ids[start:start + 200]})
+        res.raise_for_status()
+        for product in res.json():
+            products[product["id"]] = product
+    return products
+
+def get_catalog(path, params=None):
+    """GET a catalog resource, revalidating the previous copy with If-None-Match."""
+    cache = st.session_state.catalog_cache
+    key = requests.Request("GET", f"{API_URL}{path}", params=params).prepare().url
+    cached = cache.get(key)
+    headers = {"If-None-Match": cached.headers["ETag"]} if cached is not None else None
+    res = requests.get(key, headers=headers)
+    if res.status_code == 304:
+        return cached
+    cache.pop(key, None)
+    if res.status_code == 200 and "ETag" in res.headers:
+        cache[key] = res
+        if len(cache) > CATALOG_CACHE_SIZE:
+            del cache[next(iter(cache))]
+    return res
+
 def init_session_state():
     if 'token' not in st.session_state:
         st.session_state.token = None
-    if 'cart' not in st.session_state:
-        st.session_state.cart = {}  # product_id: quantity
     if 'is_admin' not in st.session_state:
         st.session_state.is_admin = False
     if 'selected_category' not in st.session_state:
         st.session_state.selected_category = None
+    if 'product_cursors' not in st.session_state:
+        st.session_state.product_cursors = [None]  # start cursor of each visited page
+    if 'product_filters' not in st.session_state:
+        st.session_state.product_filters = {}
+    if 'catalog_cache' not in st.session_state:
+        st.session_state.catalog_cache = {}  # URL: last 200 response, revalidated by ETag
+    if 'order_cursors' not in st.session_state:
+        st.session_state.order_cursors = [None]  # `before` order ID of each visited page
+    if 'admin_order_cursors' not in st.session_state:
+        st.session_state.admin_order_cursors = [None]  # start cursor of each visited page
+    if 'admin_order_filters' not in st.session_state:
+        st.session_state.admin_order_filters = {}
 
 def handle_auth():
     if st.session_state.token:
@@ -116,7 +161,7 @@ def show_category_management():
 def show_categories():
     st.header("Product Categories")
     try:
-        res = requests.get(f"{API_URL}/categories")
+        res = get_catalog("/categories")
         if res.status_code == 200:
             categories = res.json()
             
@@ -131,6 +176,7 @@ def show_categories():
                     
                     if st.button(f"View Products", key=f"cat_{category['id']}"):
                         st.session_state.selected_category = category['id']
+                        st.session_state.product_cursors = [None]
                         st.rerun()
                     
                     # Admin controls
@@ -150,17 +196,40 @@ def show_categories():
     except requests.exceptions.RequestException:
         st.error("Could not connect to the server")
 
+def show_product_filters():
+    """Render the filter/sort controls and return them as query parameters."""
+    with st.expander("Filter & sort"):
+        min_col, max_col = st.columns(2)
+        min_price = min_col.number_input("Min price", min_value=0.0, step=1.0)
+        max_price = max_col.number_input("Max price (0 = no limit)", min_value=0.0, step=1.0)
+        in_stock = st.checkbox("In stock only")
+        sort = st.selectbox("Sort by", list(SORT_OPTIONS), format_func=SORT_OPTIONS.get)
+    
+    filters = {"sort": sort, "in_stock": in_stock}
+    if min_price:
+        filters["min_price"] = min_price
+    if max_price:
+        filters["max_price"] = max_price
+    
+    # Cursors are only valid for the filters they were issued for
+    if filters != st.session_state.product_filters:
+        st.session_state.product_filters = filters
+        st.session_state.product_cursors = [None]
+    return filters
+
 def show_products():
     # Get category filter from session state
     category_id = st.session_state.get('selected_category')
+    filters = show_product_filters()
+    page_params = {**filters, "after": st.session_state.product_cursors[-1]}
     
     if category_id:
         # Show products for specific category
         try:
-            res = requests.get(f"{API_URL}/categories/{category_id}/products")
+            res = get_catalog("/products", params={**page_params, "category_id": category_id})
             if res.status_code == 200:
-                products = res.json()
-                category_res = requests.get(f"{API_URL}/categories/{category_id}")
+                page = res.json()
+                category_res = get_catalog(f"/categories/{category_id}")
                 if category_res.status_code == 200:
                     category = category_res.json()
                     st.header(f"{category['name']} Products")
@@ -168,6 +237,7 @@ def show_products():
                     # Add back button
                     if st.button("← Back to Categories"):
                         st.session_state.selected_category = None
+                        st.session_state.product_cursors = [None]
                         st.rerun()
             else:
                 st.error("Failed to fetch products")
@@ -178,9 +248,9 @@ def show_products():
     else:
         # Show all products
         try:
-            res = requests.get(f"{API_URL}/products")
+            res = get_catalog("/products", params=page_params)
             if res.status_code == 200:
-                products = res.json()
+                page = res.json()
                 st.header("All Products")
             else:
                 st.error("Failed to fetch products")
@@ -190,6 +260,7 @@ def show_products():
             return
     
     # Display products in a grid
+    products = page["items"]
     if not products:
         st.write("No products found.")
         return
@@ -213,12 +284,12 @@ def show_products():
                     key=f"qty_{product['id']}"
                 )
                 if st.button(f"Add to Cart", key=f"add_{product['id']}"):
-                    if product["id"] in st.session_state.cart:
-                        st.session_state.cart[product["id"]] += quantity
-                    else:
-                        st.session_state.cart[product["id"]] = quantity
-                    st.success(f"Added {quantity} {product['name']} to cart!")
-                    st.rerun()
+                    try:
+                        add_to_cart(product["id"], quantity)
+                        st.success(f"Added {quantity} {product['name']} to cart!")
+                        st.rerun()
+                    except requests.exceptions.RequestException:
+                        st.error("Failed to add to cart")
             
             # Admin controls
             if st.session_state.is_admin:
@@ -233,12 +304,23 @@ def show_products():
                     else:
                         st.error("Failed to delete product")
 
+    # Page navigation
+    prev_col, next_col = st.columns(2)
+    with prev_col:
+        if len(st.session_state.product_cursors) > 1 and st.button("← Previous page"):
+            st.session_state.product_cursors.pop()
+            st.rerun()
+    with next_col:
+        if page["next_cursor"] and st.button("Next page →"):
+            st.session_state.product_cursors.append(page["next_cursor"])
+            st.rerun()
+
 def show_product_management():
     st.header("Product Management")
     
     # Get categories for dropdown
     try:
-        res = requests.get(f"{API_URL}/categories")
+        res = get_catalog("/categories")
         if res.status_code == 200:
             categories = res.json()
         else:
@@ -284,102 +366,186 @@ def show_product_management():
             except requests.exceptions.RequestException:
                 st.error("Could not connect to the server")
 
+def add_to_cart(product_id, quantity):
+    """Add quantity to the product's line in the server-side cart."""
+    res = requests.get(f"{API_URL}/cart", headers=get_auth_header())
+    res.raise_for_status()
+    current = next((line["quantity"] for line in res.json() if line["product_id"] == product_id), 0)
+    res = requests.put(
+        f"{API_URL}/cart/items/{product_id}",
+        headers=get_auth_header(),
+        json={"quantity": current + quantity}
+    )
+    res.raise_for_status()
+
 def show_cart():
-    if not st.session_state.cart:
+    # One call prices every line and checks its stock
+    try:
+        res = requests.get(f"{API_URL}/cart/quote", headers=get_auth_header())
+        if res.status_code != 200:
+            st.error("Failed to fetch cart")
+            return
+        quote = res.json()
+    except requests.exceptions.RequestException:
+        st.error("Could not connect to the server")
+        return
+    
+    if not quote["items"]:
         st.write("Your cart is empty")
         return
     
     st.header("Shopping Cart")
-    total = 0
-    
-    # Fetch product details for cart items
     try:
-        items_to_remove = []
-        for product_id, quantity in st.session_state.cart.items():
-            res = requests.get(f"{API_URL}/products/{product_id}")
-            if res.status_code == 200:
-                product = res.json()
-                st.write(f"{product['name']} - Quantity: {quantity} - ${product['price'] * quantity:.2f}")
-                total += product['price'] * quantity
-                
-                if st.button(f"Remove", key=f"remove_{product_id}"):
-                    items_to_remove.append(product_id)
+        for line in quote["items"]:
+            name = line["name"] or f"Product {line['product_id']}"
+            if line["available"]:
+                st.write(f"{name} - Quantity: {line['quantity']} - ${line['line_total']:.2f}")
             else:
-                items_to_remove.append(product_id)
-        
-        # Remove items marked for deletion
-        for item in items_to_remove:
-            del st.session_state.cart[item]
-        if items_to_remove:
-            st.rerun()
-        
-        st.write(f"Total: ${total:.2f}")
-        
-        if st.button("Place Order"):
-            # Create order items list
-            order_items = [
-                {"product_id": pid, "quantity": qty}
-                for pid, qty in st.session_state.cart.items()
-            ]
+                st.warning(f"{name} - Quantity: {line['quantity']} - {line['reason']}")
             
-            # Place order
-            try:
-                res = requests.post(
-                    f"{API_URL}/orders",
-                    headers=get_auth_header(),
-                    json={"items": order_items}
+            if st.button(f"Remove", key=f"remove_{line['product_id']}"):
+                requests.delete(
+                    f"{API_URL}/cart/items/{line['product_id']}",
+                    headers=get_auth_header()
                 )
-                
-                if res.status_code == 200:
-                    st.success("Order placed successfully!")
-                    st.session_state.cart = {}  # Clear cart
-                    st.rerun()
-                else:
-                    st.error(res.json().get("detail", "Failed to place order"))
-            except requests.exceptions.RequestException:
-                st.error("Could not connect to the server")
+                st.rerun()
+        
+        st.write(f"Total: ${quote['total']:.2f}")
+        
+        if st.button("Place Order", disabled=not quote["can_checkout"]):
+            res = requests.post(f"{API_URL}/cart/checkout", headers=get_auth_header())
+            if res.status_code == 200:
+                st.success("Order placed successfully!")
+                st.rerun()
+            else:
+                st.error(res.json().get("detail", "Failed to place order"))
     except requests.exceptions.RequestException:
         st.error("Could not connect to the server")
 
 def show_orders():
     st.header("Your Orders")
     try:
-        res = requests.get(f"{API_URL}/orders", headers=get_auth_header())
+        res = requests.get(
+            f"{API_URL}/orders",
+            headers=get_auth_header(),
+            params={"limit": ORDERS_PAGE_SIZE, "before": st.session_state.order_cursors[-1]}
+        )
         if res.status_code == 200:
             orders = res.json()
+            products = fetch_products(
+                item['product_id'] for order in orders for item in order['items']
+            )
             for order in orders:
                 with st.expander(f"Order #{order['id']} - {order['status']} - ${order['total_amount']:.2f}"):
                     st.write(f"Date: {datetime.fromisoformat(order['created_at']).strftime('%Y-%m-%d %H:%M:%S')}")
                     st.write("Items:")
                     for item in order['items']:
-                        product_res = requests.get(f"{API_URL}/products/{item['product_id']}")
-                        if product_res.status_code == 200:
-                            product = product_res.json()
+                        product = products.get(item['product_id'])
+                        if product:
                             st.write(f"- {product['name']} x {item['quantity']} @ ${item['price']:.2f} each")
-                    
-                    if st.session_state.is_admin:
-                        new_status = st.selectbox(
-                            "Update Status",
-                            ["pending", "completed", "cancelled"],
-                            key=f"status_{order['id']}"
-                        )
-                        if new_status != order['status']:
-                            if st.button("Update Status", key=f"update_{order['id']}"):
-                                res = requests.put(
-                                    f"{API_URL}/orders/{order['id']}/status",
-                                    headers=get_auth_header(),
-                                    params={"status": new_status}
-                                )
-                                if res.status_code == 200:
-                                    st.success("Order status updated!")
-                                    st.rerun()
-                                else:
-                                    st.error("Failed to update order status")
+
+            newer_col, older_col = st.columns(2)
+            with newer_col:
+                if len(st.session_state.order_cursors) > 1 and st.button("← Newer orders"):
+                    st.session_state.order_cursors.pop()
+                    st.rerun()
+            with older_col:
+                if len(orders) == ORDERS_PAGE_SIZE and st.button("Older orders →"):
+                    st.session_state.order_cursors.append(orders[-1]['id'])
+                    st.rerun()
         else:
             st.error("Failed to fetch orders")
     except requests.exceptions.RequestException:
         st.error("Could not connect to the server")
 
+def show_order_status_controls(order):
+    new_status = st.selectbox(
+        "Update Status",
+        ["pending", "completed", "cancelled"],
+        index=["pending", "completed", "cancelled"].index(order['status']),
+        key=f"status_{order['id']}"
+    )
+    if new_status != order['status']:
+        if st.button("Update Status", key=f"update_{order['id']}"):
+            res = requests.put(
+                f"{API_URL}/orders/{order['id']}/status",
+                headers=get_auth_header(),
+                params={"status": new_status}
+            )
+            if res.status_code == 200:
+                st.success("Order status updated!")
+                st.rerun()
+            else:
+                st.error("Failed to update order status")
+
+def pending_order_count():
+    """Number of pending orders across all users, for the admin tab badge."""
+    try:
+        res = requests.get(
+            f"{API_URL}/admin/orders/count",
+            headers=get_auth_header(),
+            params={"status": "pending"}
+        )
+        if res.status_code == 200:
+            return res.json()["count"]
+    except requests.exceptions.RequestException:
+        pass
+    return None
+
+def show_order_management():
+    st.header("All Orders")
+    status_col, user_col = st.columns(2)
+    status = status_col.selectbox("Status", ["all", "pending", "completed", "cancelled"], key="admin_order_status")
+    user_id = user_col.number_input("User ID (0 = all users)", min_value=0, step=1, key="admin_order_user")
+    
+    filters = {}
+    if status != "all":
+        filters["status"] = status
+    if user_id:
+        filters["user_id"] = int(user_id)
+    # Cursors are only valid for the filters they were issued for
+    if filters != st.session_state.admin_order_filters:
+        st.session_state.admin_order_filters = filters
+        st.session_state.admin_order_cursors = [None]
+    
+    try:
+        res = requests.get(
+            f"{API_URL}/admin/orders",
+            headers=get_auth_header(),
+            params={**filters, "limit": ORDERS_PAGE_SIZE, "after": st.session_state.admin_order_cursors[-1]}
+        )
+        if res.status_code != 200:
+            st.error("Failed to fetch orders")
+            return
+        page = res.json()
+        products = fetch_products(
+            item['product_id'] for order in page['items'] for item in order['items']
+        )
+    except requests.exceptions.RequestException:
+        st.error("Could not connect to the server")
+        return
+    
+    for order in page['items']:
+        with st.expander(
+            f"Order #{order['id']} - user {order['user_id']} - {order['status']} - ${order['total_amount']:.2f}"
+        ):
+            st.write(f"Date: {datetime.fromisoformat(order['created_at']).strftime('%Y-%m-%d %H:%M:%S')}")
+            for item in order['items']:
+                product = products.get(item['product_id'])
+                name = product['name'] if product else f"Product #{item['product_id']}"
+                st.write(f"- {name} x {item['quantity']} @ ${item['price']:.2f} each")
+            show_order_status_controls(order)
+    
+    newer_col, older_col = st.columns(2)
+    with newer_col:
+        if len(st.session_state.admin_order_cursors) > 1 and st.button("← Newer", key="admin_orders_newer"):
+            st.session_state.admin_order_cursors.pop()
+            st.rerun()
+    with older_col:
+        if page['next_cursor'] and st.button("Older →", key="admin_orders_older"):
+            st.session_state.admin_order_cursors.append(page['next_cursor'])
+            st.rerun()
+
 def main():
     st.title("E-commerce App")
     init_session_state()
@@ -389,21 +555,32 @@ def main():
         if st.session_state.token:
             st.success("Logged in")
             if st.button("Logout"):
+                try:
+                    requests.post(f"{API_URL}/logout", headers=get_auth_header())
+                except requests.exceptions.RequestException:
+                    pass  # the token is dropped locally either way
                 st.session_state.token = None
                 st.session_state.is_admin = False
-                st.session_state.cart = {}
                 st.session_state.selected_category = None
+                st.session_state.product_cursors = [None]
+                st.session_state.order_cursors = [None]
+                st.session_state.admin_order_cursors = [None]
+                st.session_state.admin_order_filters = {}
                 st.rerun()
     
     # Main content
     if handle_auth():
         # Show admin controls
         if st.session_state.is_admin:
-            tab1, tab2 = st.tabs(["Categories", "Products"])
+            pending = pending_order_count()
+            orders_label = f"Orders ({pending} pending)" if pending else "Orders"
+            tab1, tab2, tab3 = st.tabs(["Categories", "Products", orders_label])
             with tab1:
                 show_category_management()
             with tab2:
                 show_product_management()
+            with tab3:
+                show_order_management()
         
         # Show categories and products
         if not st.session_state.selected_category: